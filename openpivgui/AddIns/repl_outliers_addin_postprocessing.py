@@ -1,6 +1,8 @@
 from openpivgui.AddIns.AddIn import AddIn
 import numpy as np
-from openpivgui.open_piv_gui_tools import create_save_vec_fname, save
+import os
+from openpivgui.open_piv_gui_tools import create_save_vec_fname, save, \
+    load
 import openpiv.filters as piv_flt
 
 
@@ -65,7 +67,7 @@ class repl_outliers_addin_postprocessing(AddIn):
         """Replace outliers."""
         result_fnames = []
         for i, f in enumerate(gui.p['fnames']):
-            data = np.loadtxt(f)
+            data = load(f)
             u, v = piv_flt.replace_outliers(
                 np.array([data[:, 2]]), np.array([data[:, 3]]),
                 method=gui.p['roa_repl_method'],
@@ -73,7 +75,8 @@ class repl_outliers_addin_postprocessing(AddIn):
                 kernel_size=gui.p['roa_repl_kernel'])
             save_fname = create_save_vec_fname(
                 path=f,
-                postfix='_repl')
+                postfix='_repl',
+                ext=os.path.splitext(f)[1])
             save(data[:, 0],
                  data[:, 1],
                  u, v,
@@ -1,7 +1,8 @@
 from openpivgui.AddIns.AddIn import AddIn
-import numpy as np
+import os
 import openpiv.validation as piv_vld
-from openpivgui.open_piv_gui_tools import create_save_vec_fname, save
+from openpivgui.open_piv_gui_tools import create_save_vec_fname, save, \
+    load
 
 
 class sig2noise_addin_postprocessing(AddIn):
@@ -55,14 +56,15 @@ class sig2noise_addin_postprocessing(AddIn):
         """
         result_fnames = []
         for i, f in enumerate(gui.p['fnames']):
-            data = np.loadtxt(f)
+            data = load(f)
             u, v, mask = piv_vld.sig2noise_val(
                 data[:, 2], data[:, 3], data[:, 5],
                 threshold=gui.p['s2n_sig2noise_threshold'])
 
             save_fname = create_save_vec_fname(
                 path=f,
-                postfix='_sig2noise')
+                postfix='_sig2noise',
+                ext=os.path.splitext(f)[1])
 
             save(data[:, 0],
                  data[:, 1],
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Global background images kept in memory and on disk."""
+
+from openpivgui.FrameCache import FrameCache
+from openpivgui.ResumeManifest import parameter_hash, file_state
+import tempfile
+import os
+import numpy as np
+
+__licence__ = '''
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+__email__ = 'vennemann@fh-muenster.de'
+
+CACHE_DIR = os.path.expanduser(os.path.join('~', '.openpivgui',
+                                            'backgrounds'))
+
+# Increase, if the computation of the backgrounds changes.
+VERSION = 1
+
+# Disk space of the cached backgrounds.
+MAX_BYTES = 2 * 2**30
+
+
+def background_key(fnames, background_type, starting_frame, ending_frame,
+                   **settings):
+    """
+        Return the cache key of a global background.
+
+        Parameters
+        ----------
+        fnames : str[]
+            Images the background is computed from.
+        background_type : str
+            Algorithm, e.g. 'global min'.
+        starting_frame, ending_frame : int
+            Frame range of the settings (the mean divides by its
+            length).
+        settings : dict
+            Further settings the background depends on.
+
+        Returns
+        -------
+        str
+            Hash of the settings and of the modification time and size
+            of every image.
+    """
+    return parameter_hash({
+        'version': VERSION,
+        'images': [[f, file_state(f)] for f in fnames],
+        'background_type': background_type,
+        'starting_frame': starting_frame,
+        'ending_frame': ending_frame,
+        'settings': settings})
+
+
+class BackgroundCache:
+    """
+        Reuses global backgrounds between runs and image previews.
+
+        The most recently used backgrounds are kept in memory and, if
+        requested, as .npy files in a directory. A background is found
+        again as long as the images, their modification times and the
+        settings are unchanged. The least recently used files are
+        removed, when there are more than »max_files« or they take
+        more than »max_bytes«.
+
+        Cached backgrounds are shared, they are returned read-only.
+
+        Parameters
+        ----------
+        directory : str
+            Cache directory, None to keep the backgrounds in memory only.
+        size : int
+            Number of backgrounds kept in memory.
+        max_files : int
+            Number of backgrounds kept on disk.
+        max_bytes : int
+            Size of the backgrounds kept on disk.
+    """
+
+    def __init__(self, directory=CACHE_DIR, size=2, max_files=16,
+                 max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.memory = FrameCache(size)
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+
+    def get(self, key, compute, disk=True):
+        """
+            Return a cached background or compute and cache it.
+
+            Parameters
+            ----------
+            key : str
+                See background_key.
+            compute : function
+                Called without arguments to produce the background.
+            disk : bool
+                Look for the background in the directory and store it
+                there, otherwise it is kept in memory only.
+
+            Returns
+            -------
+            np.array
+                The background, read-only.
+        """
+        return self.memory.get(key, lambda: self._load(key, compute, disk))
+
+    def _fname(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    def _load(self, key, compute, disk):
+        disk = disk and self.directory is not None
+        if disk:
+            try:
+                background = np.load(self._fname(key))
+                print('Using cached background {}.'.format(
+                    self._fname(key)))
+                # the file was used, keep it longest
+                os.utime(self._fname(key))
+                background.setflags(write=False)
+                return background
+            except (OSError, ValueError):
+                pass
+        background = compute()
+        background.setflags(write=False)
+        if disk:
+            self._save(key, background)
+        return background
+
+    def _save(self, key, background):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # written under a temporary name, as other processes may
+            # read the cache at the same time
+            with tempfile.NamedTemporaryFile(
+                    dir=self.directory, suffix='.tmp',
+                    delete=False) as f:
+                np.save(f, background)
+            os.replace(f.name, self._fname(key))
+            self._prune()
+        except OSError as e:
+            print('Could not cache background: {}'.format(e))
+
+    def _prune(self):
+        files = [os.path.join(self.directory, f)
+                 for f in os.listdir(self.directory) if f.endswith('.npy')]
+        files.sort(key=os.path.getmtime, reverse=True)
+        total = 0
+        for n, fname in enumerate(files):
+            try:
+                total += os.path.getsize(fname)
+                # the newest file is kept, even if it is larger
+                if n >= self.max_files or (n > 0 and
+                                           total > self.max_bytes):
+                    os.remove(fname)
+            except OSError:
+                pass
+
+    def clear(self):
+        """Remove all backgrounds from memory and disk."""
+        self.memory.clear()
+        if self.directory is not None and os.path.isdir(self.directory):
+            for f in os.listdir(self.directory):
+                if f.endswith('.npy'):
+                    os.remove(os.path.join(self.directory, f))
+
+
+# backgrounds of this process, e.g. of the GUI
+backgrounds = BackgroundCache()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""FFT cross correlation with reusable interrogation window spectra."""
+
+from openpivgui.FrameCache import FrameCache
+from numpy.fft import rfft2, irfft2, fftshift
+import numpy as np
+import scipy.fft
+import openpiv.pyprocess as piv_prc
+
+__licence__ = '''
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+__email__ = 'vennemann@fh-muenster.de'
+
+
+class CorrelationEngine:
+    """
+        First pass PIV evaluation, equivalent to
+        openpiv.pyprocess.extended_search_area_piv with
+        search_area_size == window_size.
+
+        The FFTs of the interrogation windows of each frame are kept
+        in a small cache. In time resolved sequences like (1+2),(2+3),
+        frame B of one pair is frame A of the next pair, evaluated on
+        the same grid, so one of the three FFTs per pair is saved.
+
+        Parameters
+        ----------
+        cache_size : int
+            Number of frame spectra to keep. Zero disables caching.
+        workers : int
+            Number of threads of each FFT. With more than one,
+            scipy.fft is used instead of numpy.fft.
+        single : bool
+            Compute the FFTs in single precision with scipy.fft (numpy.fft
+            always computes in double precision).
+    """
+
+    def __init__(self, cache_size=2, workers=1, single=False):
+        self.spectra = FrameCache(size=cache_size)
+        self.workers = workers
+        self.single = single
+
+    def _rfft2(self, windows, s=None):
+        if self.single:
+            return scipy.fft.rfft2(windows.astype(np.float32, copy=False),
+                                   s, workers=self.workers)
+        if self.workers > 1:
+            return scipy.fft.rfft2(windows, s, workers=self.workers)
+        return rfft2(windows, s)
+
+    def _irfft2(self, spectra):
+        if self.workers > 1 or self.single:
+            return scipy.fft.irfft2(spectra, workers=self.workers)
+        return irfft2(spectra)
+
+    def spectrum(self, frame, window_size, overlap,
+                 correlation_method='circular',
+                 normalized_correlation=False):
+        """
+            Compute the FFTs of all interrogation windows of a frame.
+
+            Parameters
+            ----------
+            frame : np.array
+                Image.
+            window_size : int
+                Size of the square interrogation windows.
+            overlap : int
+                Overlap of the interrogation windows.
+            correlation_method : str
+                'circular' or 'linear' (zero padded).
+            normalized_correlation : bool
+                Normalize the window intensities.
+
+            Returns
+            -------
+            np.array
+                Spectra of the windows, one per first axis index.
+        """
+        windows = piv_prc.sliding_window_array(
+            frame, (window_size, window_size), (overlap, overlap))
+        if normalized_correlation:
+            windows = piv_prc.normalize_intensity(windows)
+        if correlation_method == 'linear':
+            return self._rfft2(windows, self._padded_size(window_size))
+        return self._rfft2(windows)
+
+    def correlate(self, frame_a, frame_b, window_size, overlap,
+                  correlation_method='circular',
+                  normalized_correlation=False,
+                  subpixel_method='gaussian',
+                  sig2noise_method='peak2peak',
+                  width=2,
+                  key_a=None,
+                  key_b=None):
+        """
+            Cross correlate two frames on a regular grid.
+
+            Parameters
+            ----------
+            frame_a, frame_b : np.array
+                Images (e.g. int32, as passed to openpiv).
+            window_size, overlap : int
+                Interrogation window size and overlap in pixels.
+            correlation_method : str
+                'circular' or 'linear'.
+            normalized_correlation : bool
+                Normalize intensities and correlation.
+            subpixel_method : str
+                'gaussian', 'centroid' or 'parabolic'.
+            sig2noise_method : str
+                'peak2peak', 'peak2mean' or None.
+            width : int
+                Half size of the region around the first correlation
+                peak, ignored when searching the second peak.
+            key_a, key_b : hashable
+                Identify the frames (e.g. filenames) for reusing
+                their spectra. If None, nothing is cached.
+
+            Returns
+            -------
+            tuple
+                u, v, sig2noise as 2D arrays.
+        """
+        n_rows, n_cols = piv_prc.get_field_shape(
+            frame_a.shape, (window_size, window_size), (overlap, overlap))
+        args = (window_size, overlap, correlation_method,
+                normalized_correlation)
+        f2a = np.conj(self._cached_spectrum(key_a, frame_a, *args))
+        f2b = self._cached_spectrum(key_b, frame_b, *args)
+        corr = fftshift(self._irfft2(f2a * f2b).real, axes=(-2, -1))
+        if correlation_method == 'linear':
+            fsize = self._padded_size(window_size)
+            corr = corr[:,
+                        (fsize[0] - window_size) // 2:
+                        (fsize[0] + window_size) // 2,
+                        (fsize[1] - window_size) // 2:
+                        (fsize[1] + window_size) // 2]
+        if normalized_correlation:
+            corr = corr / (window_size * window_size)
+            corr = np.clip(corr, 0, 1)
+
+        u, v = piv_prc.correlation_to_displacement(
+            corr, n_rows, n_cols, subpixel_method=subpixel_method)
+        if sig2noise_method is not None:
+            sig2noise = piv_prc.sig2noise_ratio(
+                corr, sig2noise_method=sig2noise_method, width=width)
+        else:
+            sig2noise = np.zeros_like(u) * np.nan
+        return u, v, sig2noise.reshape(n_rows, n_cols)
+
+    def _cached_spectrum(self, key, frame, *args):
+        if key is None:
+            return self.spectrum(frame, *args)
+        return self.spectra.get((key,) + args,
+                                lambda: self.spectrum(frame, *args))
+
+    @staticmethod
+    def _padded_size(window_size):
+        # same zero padding as openpiv.pyprocess.fft_correlate_images
+        size = np.array((window_size, window_size)) * 2 - 1
+        return 2 ** np.ceil(np.log2(size)).astype(int) - 1
@@ -124,8 +124,8 @@ def check_postprocessing(self):  # check for file types
     self.p = self
     test = self.p['fnames'][0]  # testing if .vec or .txt files are loaded.
     ext = test.split('.')[-1]
-    if ext not in ('txt', 'vec'):
-        message = 'Please provide ASCI-II .vec or .txt files.'
+    if ext not in ('txt', 'vec', 'npz'):
+        message = 'Please provide ASCI-II .vec or .txt files or .npz files.'
         if self.p['warnings']:
             messagebox.showwarning(title='Error Message',
                                    message=message)
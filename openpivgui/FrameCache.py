@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""A bounded least recently used cache for image frames."""
+
+from collections import OrderedDict
+
+__licence__ = '''
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+__email__ = 'vennemann@fh-muenster.de'
+
+
+class FrameCache:
+    """
+        Keeps the most recently used frames of a worker process.
+
+        In sequences like (1+2),(2+3), every interior image is frame B
+        of one pair and frame A of the next pair. If neighbouring pairs
+        are processed by the same worker, the cache makes sure each
+        image is decoded and preprocessed only once.
+
+        Cached frames are shared, they must not be modified in place.
+
+        Parameters
+        ----------
+        size : int
+            Maximum number of frames to keep. A size of zero
+            disables caching.
+    """
+
+    def __init__(self, size=2):
+        self.size = size
+        self.frames = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, load):
+        """
+            Return a cached frame or load and cache it.
+
+            Parameters
+            ----------
+            key : hashable
+                Identifies the frame, e.g. the image filename.
+            load : function
+                Called without arguments to produce the frame,
+                if it is not cached.
+
+            Returns
+            -------
+            np.array
+                The frame.
+        """
+        if key in self.frames:
+            self.hits += 1
+            self.frames.move_to_end(key)
+            return self.frames[key]
+        self.misses += 1
+        frame = load()
+        if self.size > 0:
+            self.frames[key] = frame
+            while len(self.frames) > self.size:
+                self.frames.popitem(last=False)
+        return frame
+
+    def clear(self):
+        """Remove all frames."""
+        self.frames.clear()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Memory estimate of a PIV evaluation, limiting the worker processes."""
+
+import os
+
+__licence__ = '''
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+__email__ = 'vennemann@fh-muenster.de'
+
+# Interpreter, numpy, scipy and OpenPIV of a worker process.
+WORKER_OVERHEAD = 150 * 2**20
+
+# Bytes per pixel of the interrogation windows during a correlation:
+# windows of both frames, their spectra, the product and the
+# correlation planes (measured with tracemalloc, rounded up).
+CORRELATION_BYTES = 32
+
+# Float64 images held while preprocessing a frame, and while deforming
+# the frames of a pass (coordinates, interpolated frames).
+PREPROCESS_FRAMES = 3
+DEFORMATION_FRAMES = 6
+
+
+def available_memory():
+    """
+        Return the memory available for new processes in bytes.
+
+        Returns
+        -------
+        int
+            MemAvailable of /proc/meminfo, or the physical memory, if
+            the former is unknown. None, if neither can be determined.
+    """
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def n_windows(shape, window_size, overlap):
+    """Return the number of interrogation windows of a frame."""
+    step = window_size - overlap
+    rows = max(0, (shape[0] - window_size) // step + 1)
+    cols = max(0, (shape[1] - window_size) // step + 1)
+    return rows * cols
+
+
+def estimate_worker_memory(shape, plan, linear=False, cache_size=0,
+                           background=False, sliding_window=None,
+                           tile_rows=None, n_bands=1):
+    """
+        Estimate the peak memory of a worker processing one pair.
+
+        Parameters
+        ----------
+        shape : tuple
+            Shape of the images.
+        plan : openpivgui.PassPlan
+            Pass schedule with window sizes and overlaps.
+        linear : bool
+            Linear correlation, which pads the windows to twice their
+            size.
+        cache_size : int
+            Number of preprocessed frames (and window spectra) kept by
+            the frame cache of a worker.
+        background : bool
+            A background image is held by every worker.
+        sliding_window : int
+            Images k before and after the current one of a sliding
+            background, if used. Every worker holds the window.
+        tile_rows : int
+            Rows per tile of the out-of-core evaluation, if used. The
+            frames are then held in temporary files and only tiles are
+            processed in memory.
+        n_bands : int
+            Number of tiles processed at the same time by the threads
+            of a worker.
+
+        Returns
+        -------
+        int
+            Bytes.
+    """
+    pixels = shape[0] * shape[1]
+    padding = 4 if linear else 1
+    if tile_rows is not None:
+        # frames in temporary files, spectra of tiles are not cached
+        held = 0
+        cache_size = 0
+    else:
+        # preprocessed int32 frames of the pair and of the frame cache
+        held = (2 + cache_size) * 4 * pixels
+    if background:
+        held += 8 * pixels
+    if sliding_window is not None:
+        # window, one image entering it and the background
+        held += (2 * sliding_window + 3) * 8 * pixels
+    if cache_size:
+        held += cache_size * 16 * padding * n_windows(
+            shape, plan.windows[0], plan.overlaps[0]) * \
+            plan.windows[0]**2 // 2
+    if tile_rows is not None:
+        shape = (min(shape[0], tile_rows), shape[1])
+        pixels = shape[0] * shape[1]
+    peak = PREPROCESS_FRAMES * 8 * pixels
+    for i, (window, overlap) in enumerate(zip(plan.windows, plan.overlaps)):
+        correlation = CORRELATION_BYTES * padding * \
+            n_windows(shape, window, overlap) * window**2
+        if i > 0:
+            correlation += DEFORMATION_FRAMES * 8 * pixels
+        peak = max(peak, correlation)
+    if tile_rows is not None:
+        peak *= max(1, n_bands)
+    return WORKER_OVERHEAD + held + peak
+
+
+def limit_workers(n_cpus, per_worker, budget, shared=0):
+    """
+        Return the number of workers fitting into a memory budget.
+
+        Parameters
+        ----------
+        n_cpus : int
+            Requested number of workers.
+        per_worker : int
+            Estimated peak memory of a worker in bytes.
+        budget : int
+            Memory available for the evaluation in bytes.
+        shared : int
+            Memory needed independently of the number of workers, like
+            frames in flight of the streaming pipeline.
+
+        Returns
+        -------
+        int
+            At least one worker and at most n_cpus.
+    """
+    fitting = (budget - shared) // max(1, per_worker)
+    return int(max(1, min(n_cpus, fitting)))
@@ -3,8 +3,33 @@
 
 """Parallel Processing of PIV images."""
 
-from openpivgui.PreProcessing import gen_background, process_images
-from openpivgui.open_piv_gui_tools import create_save_vec_fname, _round
+from openpivgui.PreProcessing import gen_background, process_images, \
+    normalized_dtype
+from openpivgui.SlidingBackground import SlidingBackground, METHODS
+from openpivgui.FrameCache import FrameCache
+from openpivgui.CorrelationEngine import CorrelationEngine
+from openpivgui.PassPlan import PassPlan, field_change
+from openpivgui.Pipeline import Pipeline
+from openpivgui.SharedFrame import AttachedFrames
+from openpivgui.ResumeManifest import ResumeManifest, parameter_hash, \
+    file_state
+from openpivgui.StageTimer import StageTimer, TimingLog, stage
+from openpivgui.Profiling import ProfileReport, profile_call
+from openpivgui.MemoryBudget import available_memory, \
+    estimate_worker_memory, limit_workers
+from openpivgui.TileParallel import TileParallel
+from openpivgui.OutOfCore import open_image, scratch_array, row_tiles, \
+    image_maximum
+from openpivgui.ThreadLimits import limit_threads, thread_environment, \
+    threads_per_worker
+from openpivgui.open_piv_gui_tools import create_save_vec_fname, save, \
+    _round
+import multiprocessing
+import threading
+import json
+import queue
+import math
+import os
 import numpy as np
 import time
 import openpiv.smoothn as piv_smt
@@ -30,6 +55,104 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 __email__ = 'vennemann@fh-muenster.de'
 
+# Run context of a worker process. It is set once per worker by the
+# pool initializer, so tasks only need to carry the image filenames.
+_context = None
+# shared memory frames of the streaming pipeline this worker is attached to
+_frames = AttachedFrames()
+
+
+def _init_worker(context):
+    """Pool initializer: store the run context of this worker."""
+    global _context
+    _context = context
+    if context.worker_threads is not None:
+        limit_threads(context.worker_threads)
+
+
+# Seconds to wait for running blocks of pairs after cancelling.
+CANCEL_TIMEOUT = 30
+
+# Parameters read while a pair is evaluated and saved, see
+# MultiProcessing.get_parameter_hash. Add new ones here, if they change
+# the results.
+RESULT_PARAMETERS = (
+    # pairs and preprocessing
+    'sequence', 'skip', 'swap_files', 'invert', 'img_int_resize',
+    'background_subtract', 'background_type', 'starting_frame',
+    'ending_frame', 'background_window', 'background_percentile',
+    'crop_ROI', 'crop_roi-xminmax', 'crop_roi-yminmax', 'float32',
+    'out_of_core',
+    # pass schedule
+    'corr_window', 'overlap', 'coarse_factor', 'grid_refinement',
+    'custom_windowing', 'corr_window_1', 'overlap_1',
+    'pass_2', 'corr_window_2', 'pass_3', 'corr_window_3',
+    'pass_4', 'corr_window_4', 'pass_5', 'corr_window_5',
+    'pass_6', 'corr_window_6', 'pass_7', 'corr_window_7',
+    # correlation
+    'corr_method', 'subpixel_method', 'sig2noise_method', 's2n_mask',
+    'deformation_method', 'interpolation_order', 'normalize_correlation',
+    'convergence_threshold', 'warm_start', 'warm_start_passes',
+    # validation, replacement and smoothing of the passes
+    'fp_local_med_threshold', 'fp_local_med', 'fp_local_med_size',
+    'fp_vld_global_threshold', 'fp_MinU', 'fp_MaxU', 'fp_MinV', 'fp_MaxV',
+    'sp_local_med_validation', 'sp_local_med', 'sp_local_med_size',
+    'sp_vld_std_threshold', 'sp_std_threshold', 'sp_vld_global_threshold',
+    'sp_vld_global_set_first', 'sp_MinU', 'sp_MaxU', 'sp_MinV', 'sp_MaxV',
+    'adv_repl', 'adv_repl_method', 'adv_repl_iter', 'adv_repl_kernel',
+    'smoothn_each_pass', 'smoothn_first_more', 'robust1', 'smoothn_val1',
+    'smoothn_val', 'robust',
+    # scaling and output
+    'flip_u', 'flip_v', 'invert_u', 'invert_v', 'dt', 'scale',
+    'separator')
+
+
+class ProcessingCancelled(Exception):
+    """Raised in a worker, when the evaluation is cancelled."""
+
+
+def _process_task(task):
+    """Process one task of the form (index, file_a, file_b)."""
+    counter, file_a, file_b = task
+    try:
+        _, profile = _context.profiled(counter, _context.process,
+                                       (file_a, file_b, counter))
+    except ProcessingCancelled:
+        return None
+    return counter, _context.collect_timings(), profile
+
+
+def _process_block(block):
+    """Process consecutive tasks, see _process_task."""
+    return [_process_task(task) for task in block]
+
+
+def _evaluate_task(task):
+    """Pipeline task of the form (index, file_a, file_b, image_a, image_b)."""
+    counter, file_a, file_b, image_a, image_b = task
+    images = {file_a: _frames.get(image_a), file_b: _frames.get(image_b)}
+    try:
+        result, profile = _context.profiled(counter, _context.evaluate,
+                                            counter, file_a, file_b,
+                                            images.__getitem__)
+        return result, _context.collect_timings(), profile
+    finally:
+        del images
+        _frames.collect()
+
+
+def _evaluate_block(block):
+    """Pipeline block of consecutive pairs, see _evaluate_task."""
+    results = []
+    for task in block:
+        try:
+            results.append(_evaluate_task(task))
+        except ProcessingCancelled:
+            # the pairs evaluated before are still written
+            results.extend([None] * (len(block) - len(results)))
+            break
+    return results
+
 
 class MultiProcessing(piv_tls.Multiprocesser):
     """
@@ -40,8 +163,9 @@ class MultiProcessing(piv_tls.Multiprocesser):
 
         Parameters
         ----------
-        params : OpenPivParams
-            A parameter object.
+        gui : OpenPivGui or batch.BatchSession
+            Any object providing the parameter object »p« and the
+            dictionary »preprocessing_methods« of the loaded AddIns.
     """
 
     def __init__(self, gui):
@@ -50,15 +174,51 @@ class MultiProcessing(piv_tls.Multiprocesser):
 
             For separating GUI and PIV code, the output filenames are
             generated here and not in OpenPivGui. In this way, this object
-            might also be useful independently from OpenPivGui.
+            might also be useful independently from OpenPivGui, see
+            openpivgui.batch.
         """
         self.p = gui.p
         self.GUI = gui
+        self.preprocessing_methods = gui.preprocessing_methods
+        # shared with the worker processes, see cancel()
+        self.cancel_event = multiprocessing.Event()
+        self.cancelled = False
+        # wall and CPU time of the processing stages, if enabled
+        self.timer = StageTimer() if (self.p['timing'] or
+                                      self.p['profile_memory']) else None
+        self.timing_log = None
+        # BLAS/OpenMP threads of each worker process, set by run()
+        self.worker_threads = None
+        # JSON lines file of the passes used per pair, if adaptive
+        self.pass_log = None
+        # final field of the last pair of this process, see
+        # get_warm_start()
+        self.previous = None
+        # cProfile statistics of sampled pairs, see profiled()
+        self.profile_report = None
+        # progress events of the workers, see report(); run() forwards
+        # them to »events«, which is read by the GUI
+        self.progress = multiprocessing.Queue()
+        self.events = queue.Queue()
 
         # generate background if needed
-        if self.p['background_subtract']\
+        self.sliding = None
+        if self.p['background_subtract'] \
+                and self.p['background_type'] in METHODS:
+            # each worker keeps a window of the neighbouring images
+            self.sliding = SlidingBackground(
+                self.p['fnames'], self.p['background_window'],
+                METHODS[self.p['background_type']],
+                self.p['background_percentile'])
+            self.background = None
+        elif self.p['background_subtract']\
                 and self.p['background_type'] != 'minA - minB':
-            self.background = gen_background(self.p)
+            # the images are reduced by the cores selected for the run
+            if self.p['manual_select_cores']:
+                n_cpus = self.p['cores']
+            else:
+                n_cpus = os.cpu_count() or 1
+            self.background = gen_background(self.p, n_cpus=n_cpus)
         else:
             self.background = None
 
@@ -82,6 +242,27 @@ class MultiProcessing(piv_tls.Multiprocesser):
         if self.p['swap_files']:
             self.files_a, self.files_b = self.files_b, self.files_a
 
+        # In overlapping sequences, neighbouring pairs share images. The
+        # frames of the last pairs are kept, so each image is decoded
+        # and preprocessed only once per worker. One more frame is kept
+        # than the pairs share, as the new image of a pair is requested
+        # before the shared one, if the files are swapped.
+        if self.p['sequence'] == '(1+2),(2+3)':
+            self.frame_cache = FrameCache(size=self.p['skip'] + 2)
+        else:
+            self.frame_cache = FrameCache(size=0)
+        # The first pass runs on the same grid for every pair, so the
+        # window spectra of a shared image can be reused as well.
+        self.correlation = CorrelationEngine(
+            cache_size=self.frame_cache.size,
+            single=self.p['float32'])
+        # preprocessed frames are int32 as expected by OpenPIV or, in
+        # single precision mode, float32 with fractional grey values
+        self.frame_dtype = np.float32 if self.p['float32'] else np.int32
+        # working buffer of the preprocessing, reused for every frame of
+        # a worker, see preprocess()
+        self.buffer = None
+
         self.n_files = len(self.files_a)
         self.save_fnames = []
 
@@ -94,7 +275,8 @@ class MultiProcessing(piv_tls.Multiprocesser):
                                       basename=self.p['vec_fname'],
                                       postfix=postfix,
                                       count=n,
-                                      max_count=self.n_files))
+                                      max_count=self.n_files,
+                                      ext='.' + self.p['save_format']))
 
         # setup widgets so the user could still use the GUI when processing
         self.parameter = {}
@@ -108,6 +290,81 @@ class MultiProcessing(piv_tls.Multiprocesser):
                 if 1030 < self.p.index[key] < 4000:
                     self.parameter[key] = self.p[key]
 
+        # the pass schedule is the same for all image pairs
+        self.plan = PassPlan(self.parameter)
+        # threads evaluating horizontal bands of a pair, if enabled
+        if self.p['out_of_core']:
+            self.tiles = TileParallel(self.p['tile_bands'],
+                                      tile_rows=self.p['tile_rows'],
+                                      out_of_core=True)
+        elif self.p['tile_bands'] > 1 or self.p['float32']:
+            self.tiles = TileParallel(self.p['tile_bands'])
+        else:
+            self.tiles = None
+        if self.p['float32']:
+            # single precision FFTs in all passes
+            self.tiles.correlation = self.correlation
+
+        # results of earlier runs, which are still up to date, are kept
+        self.manifest = None
+        if self.p['resume'] and self.n_files > 0:
+            self.manifest = ResumeManifest(
+                os.path.join(os.path.dirname(self.save_fnames[0]),
+                             self.p['vec_fname'] + '_manifest.jsonl'),
+                self.get_parameter_hash())
+
+    def __getstate__(self):
+        """Leave the GUI behind when the object is sent to a worker."""
+        state = self.__dict__.copy()
+        state.pop('GUI', None)
+        state.pop('events', None)
+        if multiprocessing.context.get_spawning_popen() is None:
+            # sent with a task, not inherited by a starting worker, e.g.
+            # by run(func=...); synchronization primitives can only be
+            # inherited, so these pairs cannot be cancelled or reported
+            state['cancel_event'] = None
+            state['progress'] = None
+        state['timing_log'] = None
+        state['profile_report'] = None
+        # only the main process keeps track of finished pairs
+        state['manifest'] = None
+        state['buffer'] = None
+        return state
+
+    def get_parameter_hash(self):
+        """
+            Return a hash of everything the results depend on.
+
+            These are the parameters listed in RESULT_PARAMETERS, the
+            names of the preprocessing AddIns and their parameters and,
+            for global backgrounds, the state of the images the
+            background is computed from. Out-of-core, the tiling of the
+            preprocessing is included as well. Settings that do not
+            change the results, like the number of cores, are left out.
+
+            Returns:
+                str: SHA-256 hex digest.
+        """
+        keys = list(RESULT_PARAMETERS)
+        if self.p['out_of_core']:
+            # AddIn filters see the rows of a tile and its halo
+            keys += ['tile_rows', 'tile_halo']
+        for method in self.preprocessing_methods.values():
+            addin = getattr(method, '__self__', None)
+            if hasattr(addin, 'get_variables'):
+                keys += sorted(addin.get_variables())
+        values = {key: self.p[key] for key in keys if key in self.p.param}
+        values['preprocessing_methods'] = sorted(self.preprocessing_methods)
+        if self.background is not None:
+            values['background_images'] = [
+                [f, file_state(f)] for f in
+                self.p['fnames'][self.p['starting_frame']:
+                                 self.p['ending_frame']]]
+        elif self.sliding is not None:
+            values['background_images'] = [
+                [f, file_state(f)] for f in self.p['fnames']]
+        return parameter_hash(values)
+
     def get_save_fnames(self):
         """
             Return a list of result filenames.
@@ -126,6 +383,554 @@ class MultiProcessing(piv_tls.Multiprocesser):
         """
         return len(self.files_a)
 
+    def get_tasks(self):
+        """
+            Return the list of tasks handed to the worker processes.
+
+            If resuming is enabled, pairs with up to date results are
+            left out.
+
+            Returns:
+                tuple[]: (index, file_a, file_b) for each image pair.
+        """
+        tasks = [(n, file_a, file_b) for n, (file_a, file_b)
+                 in enumerate(zip(self.files_a, self.files_b))]
+        if self.manifest is not None:
+            tasks = [task for task in tasks if not self.manifest.is_current(
+                self.save_fnames[task[0]], task[1:])]
+            print('Skipping {} up to date image pair(s).'
+                  .format(self.n_files - len(tasks)))
+        return tasks
+
+    def finished(self, counter, timings=None, profile=None):
+        """
+            Called in the main process, when the result of a pair is saved.
+
+            Parameters
+            ----------
+            counter : int
+                Index of the image pair.
+            timings : list
+                Stage timings of the pair, see collect_timings.
+            profile : dict
+                Profile statistics, if the pair was profiled.
+        """
+        if self.profile_report is not None and profile is not None:
+            self.profile_report.add(profile, timings)
+        if self.timing_log is not None and timings is not None:
+            self.timing_log.record(counter, timings,
+                                   file_a=self.files_a[counter],
+                                   file_b=self.files_b[counter])
+        if self.manifest is not None:
+            self.manifest.record(self.save_fnames[counter],
+                                 [self.files_a[counter],
+                                  self.files_b[counter]])
+
+    def get_chunksize(self, n_cpus):
+        """
+            Return the number of consecutive pairs handed to a worker.
+
+            If neighbouring pairs share images or a sliding background
+            is used, they are given to the same worker in blocks, so the
+            frame cache and the background window can be reused.
+            About four blocks per worker keep the load balanced.
+
+            Parameters
+            ----------
+            n_cpus : int
+                Number of worker processes.
+
+            Returns
+            -------
+            int
+                Chunk size for the pool.
+        """
+        if self.frame_cache.size == 0 and not self.p['warm_start'] \
+                and self.sliding is None:
+            return 1
+        return max(1, math.ceil(self.n_files / (4 * n_cpus)))
+
+    def get_worker_limit(self, n_cpus):
+        """
+            Limit the number of workers to the memory budget.
+
+            The peak memory of a worker is estimated from the shape of
+            the first frame and the pass schedule, out-of-core from the
+            tiles. The budget is
+            »memory_budget« or, if zero, 80 % of the available memory.
+
+            Parameters
+            ----------
+            n_cpus : int
+                Requested number of worker processes.
+
+            Returns
+            -------
+            int
+                Number of worker processes to start.
+        """
+        if n_cpus <= 1 or self.n_files == 0:
+            return n_cpus
+        budget = self.p['memory_budget'] * 2**30
+        if budget <= 0:
+            budget = available_memory()
+            if budget is None:
+                return n_cpus
+            budget *= 0.8
+        frame = None
+        if self.p['out_of_core']:
+            # only the header is read
+            frame = open_image(self.files_a[0])
+        if frame is None:
+            frame = piv_tls.imread(self.files_a[0])
+        per_worker = estimate_worker_memory(
+            frame.shape, self.plan,
+            linear=self.p['corr_method'] == 'linear',
+            cache_size=self.frame_cache.size,
+            background=self.background is not None,
+            sliding_window=(None if self.sliding is None
+                            else self.sliding.window),
+            tile_rows=(self.p['tile_rows'] if self.p['out_of_core']
+                       else None),
+            n_bands=self.p['tile_bands'])
+        shared = 0
+        if self.p['pipeline'] and not self.p['out_of_core']:
+            # decoded frames in flight, held by the main process
+            shared = 2 * self.p['pipeline_depth'] * frame.nbytes
+        limit = limit_workers(n_cpus, per_worker, budget, shared)
+        if limit < n_cpus:
+            print('Memory budget of {:.1f} GB allows {} of {} worker(s) '
+                  '(about {:.0f} MB each).'.format(
+                      budget / 2**30, limit, n_cpus, per_worker / 2**20))
+        return limit
+
+    def get_warm_start(self, counter):
+        """
+            Return the field a pair's evaluation starts from, if enabled.
+
+            If the previous pair was evaluated by the same process, its
+            final field (in pixels, before scaling) is the predictor of
+            the first evaluated pass and the first »warm_start_passes«
+            passes are skipped. The field is interpolated to the grid
+            of that pass.
+
+            Parameters
+            ----------
+            counter : int
+                Index of the image pair.
+
+            Returns
+            -------
+            tuple
+                Number of the first pass to evaluate (starting at one)
+                and x, y, u, v of the previous pair or None, if the
+                pair is evaluated from the first pass on.
+        """
+        if not self.p['warm_start'] or self.previous is None \
+                or self.plan.passes < 2:
+            return None
+        previous, x, y, u, v = self.previous
+        if previous != counter - 1:
+            return None
+        skip = min(max(1, self.p['warm_start_passes']),
+                   self.plan.passes - 1)
+        return skip + 1, x, y, u, v
+
+    def cancel(self):
+        """
+            Stop a running evaluation, e.g. from the GUI thread.
+
+            Pairs not yet started are skipped and running pairs stop
+            at the next pass. The workers are waited for up to
+            CANCEL_TIMEOUT seconds, so every result already written is
+            recorded. Result files are replaced atomically, so none of
+            them is left half written. After run returned,
+            »cancelled« is True.
+        """
+        self.cancel_event.set()
+
+    def collect_timings(self):
+        """
+            Return and reset the stage timings recorded in this process.
+
+            Returns:
+                list: [stage, wall time, CPU time] entries or None,
+                if timing is disabled.
+        """
+        if self.timer is None:
+            return None
+        return self.timer.collect()
+
+    def profiled(self, counter, func, *args):
+        """
+            Call func(*args), under cProfile if the pair is sampled.
+
+            With profiling enabled, every n-th pair (»profile_every«) is
+            profiled. If »profile_memory« is set, tracemalloc runs as
+            well and the stage timings include the peak memory.
+
+            Parameters
+            ----------
+            counter : int
+                Index of the image pair.
+            func : function
+                Function processing the pair.
+
+            Returns
+            -------
+            tuple
+                The return value of func and the profile statistics or
+                None, if the pair is not profiled.
+        """
+        if not self.p['profile'] or \
+                counter % max(1, self.p['profile_every']) != 0:
+            return func(*args), None
+        return profile_call(func, *args, memory=self.p['profile_memory'])
+
+    def report(self, event, counter, **info):
+        """
+            Send a progress event to the main process.
+
+            While run() is active, the events are passed on to the queue
+            »events«, see openpivgui.Progress for their meaning.
+
+            Parameters
+            ----------
+            event : str
+                'start', 'pass' or 'done'.
+            counter : int
+                Index of the image pair.
+            info :
+                Further entries of the event.
+        """
+        if self.progress is not None:
+            self.progress.put(dict(info, event=event, pair=counter,
+                                   time=time.time()))
+
+    def check_cancelled(self):
+        """Raise ProcessingCancelled, if cancel() was called."""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ProcessingCancelled()
+
+    def run(self, func=None, n_cpus=1):
+        """
+            Process all image pairs.
+
+            Each worker process receives this object once, as its run
+            context, through the pool initializer. The tasks only carry
+            the index and the filenames of an image pair. This avoids
+            pickling the parameters and AddIn methods for every pair.
+
+            If the streaming pipeline is enabled, the images are decoded
+            by threads of this process and the results are written by
+            a separate thread, see openpivgui.Pipeline.
+
+            Progress events of the workers appear in the queue »events«
+            while the tasks are processed.
+
+            Parameters
+            ----------
+            func : function
+                If given, the inherited execution model is used
+                instead, which sends func with every task. Pairs of
+                that model are neither reported nor cancelled.
+            n_cpus : int
+                Number of worker processes.
+        """
+        if func is not None:
+            return super().run(func=func, n_cpus=n_cpus)
+        tasks = self.get_tasks()
+        n_cpus = self.get_worker_limit(n_cpus)
+        if self.p['fft_threads'] and 0 < len(tasks) < n_cpus:
+            # a process per pair, the remaining cores compute the FFTs
+            self.correlation.workers = n_cpus // len(tasks)
+            n_cpus = len(tasks)
+            # the later passes are correlated by the same engine
+            if self.tiles is None:
+                self.tiles = TileParallel(1)
+            self.tiles.correlation = self.correlation
+            print('Using {} process(es) with {} FFT thread(s) each.'
+                  .format(n_cpus, self.correlation.workers))
+        if n_cpus > 1 or self.p['pipeline']:
+            self.worker_threads = threads_per_worker(
+                n_cpus, self.p['worker_threads'])
+        collector = threading.Thread(target=self._collect_progress,
+                                     daemon=True)
+        collector.start()
+        self.report('run', None, total=len(tasks))
+        if self.n_files > 0:
+            base = os.path.join(os.path.dirname(self.save_fnames[0]),
+                                self.p['vec_fname'])
+            if self.p['timing']:
+                self.timing_log = TimingLog(base + '_timing.jsonl')
+            if self.p['profile']:
+                self.profile_report = ProfileReport()
+            if self.parameter['convergence_threshold'] > 0:
+                # passes used per pair, see _collect_progress
+                self.pass_log = base + '_passes.jsonl'
+                open(self.pass_log, 'w').close()
+        try:
+            if self.worker_threads is None:
+                self._run_tasks(tasks, n_cpus)
+            else:
+                with thread_environment(self.worker_threads):
+                    self._run_tasks(tasks, n_cpus)
+        finally:
+            self.progress.put(None)
+            # a terminated worker may have left the queue unusable
+            collector.join(timeout=5)
+            if self.timing_log is not None:
+                print('Stage timings of all image pairs:\n' +
+                      self.timing_log.summary(base + '_timing_summary.json'))
+            if self.profile_report is not None:
+                fnames = self.profile_report.write(base + '_profile')
+                print('Profiled {} image pair(s): {}'.format(
+                    self.profile_report.pairs, ', '.join(fnames)))
+                if self.profile_report.peaks:
+                    print(self.profile_report.memory_table())
+        self.cancelled = self.cancel_event.is_set()
+        if self.cancelled:
+            # left by workers terminated while writing
+            for fname in self.save_fnames:
+                if os.path.exists(fname + '.part'):
+                    os.remove(fname + '.part')
+            print('PIV evaluation cancelled.')
+
+    def _collect_progress(self):
+        """Pass the progress events of the workers on to »events«."""
+        for event in iter(self.progress.get, None):
+            if event['event'] == 'done' and self.pass_log is not None:
+                with open(self.pass_log, 'a') as f:
+                    f.write(json.dumps({
+                        'pair': event['pair'],
+                        'file_a': self.files_a[event['pair']],
+                        'file_b': self.files_b[event['pair']],
+                        'passes': event['passes'],
+                        'changes': event['changes']}) + '\n')
+            self.events.put(event)
+
+    def _run_tasks(self, tasks, n_cpus):
+        """Process the tasks in the selected execution mode."""
+        if self.p['pipeline'] and not self.p['out_of_core']:
+            # images are read by threads of this process, their timings
+            # are added to the first pair using the image; »read« of the
+            # workers only covers attaching the shared frames
+            read_times = {}
+
+            def read(fname):
+                timer = StageTimer()
+                with timer.stage('read (reader thread)'):
+                    image = piv_tls.imread(fname)
+                read_times[fname] = timer.collect()
+                return image
+
+            def write(item):
+                result, timings, profile = item
+                self.save_result(result)
+                counter = result[0]
+                if timings is not None:
+                    timings = (read_times.pop(self.files_a[counter], []) +
+                               read_times.pop(self.files_b[counter], []) +
+                               timings + self.collect_timings())
+                self.finished(counter, timings, profile)
+            Pipeline(tasks,
+                     read=read,
+                     evaluate=_evaluate_block,
+                     write=write,
+                     n_cpus=n_cpus,
+                     n_readers=self.p['reader_threads'],
+                     depth=self.p['pipeline_depth'],
+                     initializer=_init_worker,
+                     initargs=(self,),
+                     cancel_event=self.cancel_event,
+                     chunksize=self.get_chunksize(n_cpus),
+                     cancel_timeout=CANCEL_TIMEOUT).run()
+        elif n_cpus > 1:
+            # leaving the with block terminates outstanding tasks
+            with multiprocessing.Pool(processes=n_cpus,
+                                      initializer=_init_worker,
+                                      initargs=(self,)) as pool:
+                # blocks are formed here, as the iterator of chunked
+                # tasks returned by the pool has no timeout
+                chunksize = self.get_chunksize(n_cpus)
+                blocks = [tasks[i:i + chunksize]
+                          for i in range(0, len(tasks), chunksize)]
+                results = pool.imap_unordered(_process_block, blocks)
+                deadline = None
+                while True:
+                    # after cancelling, the running blocks stop at their
+                    # next check and return the pairs they finished
+                    if deadline is None and self.cancel_event.is_set():
+                        deadline = time.time() + CANCEL_TIMEOUT
+                    try:
+                        done = results.next(timeout=0.2)
+                    except multiprocessing.TimeoutError:
+                        if deadline is not None \
+                                and time.time() > deadline:
+                            break
+                        continue
+                    except StopIteration:
+                        break
+                    for result in done:
+                        if result is not None:
+                            self.finished(*result)
+        else:
+            _init_worker(self)
+            for task in tasks:
+                if self.cancel_event.is_set():
+                    break
+                done = _process_task(task)
+                if done is not None:
+                    self.finished(*done)
+
+    def get_background(self, fname):
+        """
+            Return the background of an image.
+
+            This is the global background or, for the sliding
+            backgrounds, the one of the window around the image.
+
+            Parameters
+            ----------
+            fname : str
+                Image file.
+
+            Returns
+            -------
+            np.array
+                Background or None, if no background is subtracted.
+        """
+        if self.sliding is None:
+            return self.background
+        with stage(self.timer, 'background'):
+            return self.sliding.get(fname)
+
+    def get_read_order(self, file_a, file_b):
+        """
+            Return the images of a pair in the order they are read.
+
+            With a sliding background, the earlier image of the sequence
+            is read first, e.g. if the files are swapped, so the window
+            only moves forward (see SlidingBackground.get).
+
+            Parameters
+            ----------
+            file_a, file_b : str
+                Image files.
+
+            Returns
+            -------
+            tuple
+                The image files.
+        """
+        if self.sliding is not None \
+                and self.sliding.index[file_b] < self.sliding.index[file_a]:
+            return file_b, file_a
+        return file_a, file_b
+
+    def preprocess(self, frame, background):
+        """
+            Run the preprocessing chain on a decoded image.
+
+            Parameters
+            ----------
+            frame : np.array
+                Image as returned by openpiv.tools.imread.
+            background : np.array
+                Background to subtract, if enabled.
+
+            Returns
+            -------
+            np.array
+                The preprocessed frame.
+        """
+        if self.frame_dtype is np.int32 and frame.dtype.kind in 'ui' \
+                and np.can_cast(frame.dtype, np.int32):
+            # converted exactly, the normalization gives the same float64
+            # image without the int32 copy
+            image = frame
+        else:
+            image = frame.astype(self.frame_dtype)
+        dtype = normalized_dtype(image)
+        if self.buffer is None or self.buffer.shape != image.shape \
+                or self.buffer.dtype != dtype:
+            self.buffer = np.empty(image.shape, dtype)
+        frame = process_images(self, image,
+                               self.preprocessing_methods,
+                               background=background,
+                               timer=self.timer,
+                               out=self.buffer)
+        # converted only once, OpenPIV expects integer images
+        frame = frame.astype(self.frame_dtype, copy=False)
+        if np.may_share_memory(frame, self.buffer):
+            # the frame is kept, e.g. by the frame cache, in single
+            # precision mode
+            self.buffer = None
+        return frame
+
+    def preprocess_tiled(self, image, background=None, images=None):
+        """
+            Run the preprocessing chain tile by tile.
+
+            The image is processed in blocks of »tile_rows« rows. AddIn
+            filters see »tile_halo« additional rows above and below each
+            block. The result is written to a temporary file mapped to
+            memory, so no full size copy is held in memory.
+
+            Parameters
+            ----------
+            image : np.array
+                Decoded image, usually a memory map, see
+                openpivgui.OutOfCore.open_image.
+            background : np.array
+                Background to subtract, if enabled.
+            images : tuple
+                Both images of the pair, if the 'minA - minB' background
+                is computed tile by tile.
+
+            Returns
+            -------
+            np.memmap
+                The preprocessed frame, see »frame_dtype«.
+        """
+        tile_rows = self.p['tile_rows']
+        halo = self.p['tile_halo']
+        maximum = image_maximum(image, tile_rows)
+        if images is not None:
+            maxima = [image_maximum(i, tile_rows) for i in images]
+        rows, cols = slice(None), slice(None)
+        if self.p['crop_ROI']:
+            crop_x = self.p['crop_roi-xminmax'].split(',')
+            crop_y = self.p['crop_roi-yminmax'].split(',')
+            rows = slice(int(crop_y[0]), int(crop_y[1]))
+            cols = slice(int(crop_x[0]), int(crop_x[1]))
+        start, stop, _ = rows.indices(image.shape[0])
+        first, last, _ = cols.indices(image.shape[1])
+        frame = scratch_array((max(0, stop - start), max(0, last - first)),
+                              self.frame_dtype)
+        for top, bottom in row_tiles(start, stop, tile_rows):
+            lower, upper = max(start, top - halo), min(stop, bottom + halo)
+            tile = np.asarray(image[lower:upper, cols])
+            if images is not None:
+                tile_background = gen_background(
+                    self.p,
+                    images[0][lower:upper, cols],
+                    images[1][lower:upper, cols],
+                    maxima=maxima)
+            elif background is not None:
+                tile_background = background[lower:upper, cols]
+            else:
+                tile_background = None
+            tile = process_images(self, tile.astype(self.frame_dtype),
+                                  self.preprocessing_methods,
+                                  background=tile_background,
+                                  timer=self.timer,
+                                  maximum=maximum,
+                                  crop=False)
+            frame[top - start:bottom - start] = \
+                tile[top - lower:bottom - lower]
+        return frame
+
     def process(self, args):
         """
             Process chain as configured in the GUI.
@@ -140,9 +945,100 @@ class MultiProcessing(piv_tls.Multiprocesser):
                                  list
         """
         file_a, file_b, counter = args
-        frame_a = piv_tls.imread(file_a)
-        frame_b = piv_tls.imread(file_b)
+        self.save_result(self.evaluate(counter, file_a, file_b))
+
+    def read_frames(self, counter, file_a, file_b, read=piv_tls.imread):
+        """
+            Decode and preprocess the images of a pair.
 
+            Parameters
+            ----------
+            counter : int
+                Index of the image pair.
+            file_a, file_b : str
+                Image files.
+            read : function
+                Returns the decoded image of a filename.
+
+            Returns
+            -------
+            tuple
+                frame_a, frame_b of type »frame_dtype«.
+        """
+        self.check_cancelled()
+        print('\nPre-pocessing image pair: {}'.format(counter + 1))
+
+        decode = read
+
+        def read(fname):
+            with stage(self.timer, 'read'):
+                return decode(fname)
+        if self.p['out_of_core']:
+            return self.read_frames_tiled(file_a, file_b, read)
+        if self.p['background_subtract'] \
+                and self.p['background_type'] == 'minA - minB':
+            # the background depends on the pair, so only the decoded
+            # images can be reused
+            frame_a = self.frame_cache.get(file_a, lambda: read(file_a))
+            frame_b = self.frame_cache.get(file_b, lambda: read(file_b))
+            background = gen_background(self.p, frame_a, frame_b)
+            frame_a = self.preprocess(frame_a, background)
+            frame_b = self.preprocess(frame_b, background)
+        else:
+            frames = {}
+            for fname in self.get_read_order(file_a, file_b):
+                frames[fname] = self.frame_cache.get(
+                    fname, lambda: self.preprocess(
+                        read(fname), self.get_background(fname)))
+            frame_a, frame_b = frames[file_a], frames[file_b]
+        return frame_a, frame_b
+
+    def read_frames_tiled(self, file_a, file_b, read):
+        """
+            Map the images of a pair into memory and preprocess them
+            tile by tile, see preprocess_tiled.
+
+            Images which cannot be mapped (see OutOfCore.open_image) are
+            decoded by read as a whole.
+        """
+        def open_frame(fname):
+            image = open_image(fname)
+            if image is None:
+                print('Cannot map {} into memory, decoding it as a whole.'
+                      .format(fname))
+                image = read(fname)
+            return image
+        if self.p['background_subtract'] \
+                and self.p['background_type'] == 'minA - minB':
+            images = open_frame(file_a), open_frame(file_b)
+            return (self.preprocess_tiled(images[0], images=images),
+                    self.preprocess_tiled(images[1], images=images))
+        frames = {}
+        for fname in self.get_read_order(file_a, file_b):
+            frames[fname] = self.frame_cache.get(
+                fname, lambda: self.preprocess_tiled(
+                    open_frame(fname), self.get_background(fname)))
+        return frames[file_a], frames[file_b]
+
+    def evaluate(self, counter, file_a, file_b, read=piv_tls.imread):
+        """
+            Evaluate an image pair, from the decoding of the images up to
+            the scaled vector field.
+
+            Parameters
+            ----------
+            counter : int
+                Index of the image pair.
+            file_a, file_b : str
+                Image files.
+            read : function
+                Returns the decoded image of a filename.
+
+            Returns
+            -------
+            tuple
+                counter, x, y, u, v, mask, sig2noise
+        """
         # Smoothning script borrowed from openpiv.windef
         s = self.p['smoothn_val']
 
@@ -152,247 +1048,236 @@ class MultiProcessing(piv_tls.Multiprocesser):
                 u, s=s, isrobust=self.p['robust'])
             return(u)
 
-        # delimiters placed here for safety
-        delimiter = self.p['separator']
-        if delimiter == 'tab':
-            delimiter = '\t'
-        if delimiter == 'space':
-            delimiter = ' '
-
-        # preprocessing
-        print('\nPre-pocessing image pair: {}'.format(counter + 1))
-        if self.p['background_subtract'] \
-                and self.p['background_type'] == 'minA - minB':
-            self.background = gen_background(self.p, frame_a, frame_b)
-
-        frame_a = frame_a.astype(np.int32)
-        frame_a = process_images(self, frame_a, self.GUI.preprocessing_methods,
-                                 background=self.background)
-        frame_b = frame_b.astype(np.int32)
-        frame_b = process_images(self, frame_b, self.GUI.preprocessing_methods,
-                                 background=self.background)
+        self.report('start', counter, passes=self.plan.passes)
+        started = time.time()
+        frame_a, frame_b = self.read_frames(counter, file_a, file_b, read)
 
         print('Evaluating image pair: {}'.format(counter + 1))
 
         # evaluation first pass
         start = time.time()
-        passes = 1
-        # setup custom windowing if selected
-        if self.parameter['custom_windowing']:
-            corr_window_0 = self.parameter['corr_window_1']
-            overlap_0 = self.parameter['overlap_1']
-            for i in range(2, 8):
-                if self.parameter['pass_%1d' % i]:
-                    passes += 1
-                else:
-                    break
-
-        else:
-            passes = self.parameter['coarse_factor']
-            if self.parameter['grid_refinement'] == 'all passes' \
-                    and self.parameter['coarse_factor'] != 1:
-                corr_window_0 = self.parameter['corr_window'] * \
-                    2**(self.parameter['coarse_factor'] - 1)
-                overlap_0 = self.parameter['overlap'] * \
-                    2**(self.parameter['coarse_factor'] - 1)
-
-            # Refine all passes after first when there are more than 1 pass.
-            elif self.parameter['grid_refinement'] == '2nd pass on' \
-                    and self.parameter['coarse_factor'] != 1:
-                corr_window_0 = self.parameter['corr_window'] * \
-                    2**(self.parameter['coarse_factor'] - 2)
-                overlap_0 = self.parameter['overlap'] * \
-                    2**(self.parameter['coarse_factor'] - 2)
-
-            # If >>none<< is selected or something goes wrong, the window
-            # size would remain the same.
-            else:
-                corr_window_0 = self.parameter['corr_window']
-                overlap_0 = self.parameter['overlap']
-        overlap_percent = overlap_0 / corr_window_0
+        plan = self.plan
+        passes = plan.passes
+        corr_window_0 = plan.windows[0]
+        overlap_0 = plan.overlaps[0]
+        overlap_percent = plan.overlap_percent
         sizeX = corr_window_0
 
-        u, v, sig2noise = piv_wdf.extended_search_area_piv(
-            frame_a.astype(np.int32),
-            frame_b.astype(np.int32),
-            window_size=corr_window_0,
-            overlap=overlap_0,
-            search_area_size=corr_window_0,
-            width=self.parameter['s2n_mask'],
-            subpixel_method=self.parameter['subpixel_method'],
-            sig2noise_method=self.parameter['sig2noise_method'],
-            correlation_method=self.parameter['corr_method'],
-            normalized_correlation=self.parameter['normalize_correlation'])
-
-        x, y = piv_wdf.get_rect_coordinates(frame_a.shape,
-                                            corr_window_0,
-                                            overlap_0)
-
-        # validating first pass
-        mask = np.zeros_like(x, dtype=bool)
-        u = np.ma.copy(u)
-        v = np.ma.copy(v)
-
-        if self.parameter['fp_vld_global_threshold']:
-            Mask = piv_vld.global_val(
-                u, v,
-                u_thresholds=(self.parameter['fp_MinU'],
-                              self.parameter['fp_MaxU']),
-                v_thresholds=(self.parameter['fp_MinV'],
-                              self.parameter['fp_MaxV']))
-            # consolidate effects of mask
-            mask += Mask
-
-        if self.parameter['fp_local_med']:
-            Mask = piv_vld.local_median_val(
-                u, v,
-                u_threshold=self.parameter['fp_local_med'],
-                v_threshold=self.parameter['fp_local_med'],
-                size=self.parameter['fp_local_med_size'])
-            mask += Mask
-
-        if self.parameter['adv_repl']:
-            u, v = piv_flt.replace_outliers(
-                u, v, mask,
-                method=self.parameter['adv_repl_method'],
-                max_iter=self.parameter['adv_repl_iter'],
-                kernel_size=self.parameter['adv_repl_kernel'])
-        print('Validated first pass result of image pair: {}.'
-              .format(counter + 1))
-
-        # smoothning  before deformation if 'each pass' is selected
-        if self.parameter['smoothn_each_pass']:
-            if self.parameter['smoothn_first_more']:
-                s *= 2
-            u = smoothn(u, s)
-            v = smoothn(v, s)
-            print('Smoothned pass 1 for image pair: {}.'.format(counter + 1))
-            s = self.parameter['smoothn_val1']
-
-        print('Finished pass 1 for image pair: {}.'.format(counter + 1))
-        print("window size: " + str(corr_window_0))
-        print('overlap: ' + str(overlap_0), '\n')
-
-        # evaluation of all other passes
-        if passes != 1:
-            iterations = passes - 1
-            for i in range(2, passes + 1):
-                # setting up the windowing of each pass
-                if self.parameter['custom_windowing']:
-                    corr_window = self.parameter['corr_window_%1d' % i]
-                    overlap = int(corr_window * overlap_percent)
-
+        # time resolved sequences may start from the previous field
+        warm = self.get_warm_start(counter)
+        if warm is None:
+            first_pass = 2
+            used = [1]
+            # spectra may only be shared if the frames do not depend on the
+            # pair they belong to
+            if self.p['background_subtract'] \
+                    and self.p['background_type'] == 'minA - minB':
+                key_a, key_b = None, None
+            else:
+                key_a, key_b = file_a, file_b
+            options = dict(
+                width=self.parameter['s2n_mask'],
+                subpixel_method=self.parameter['subpixel_method'],
+                sig2noise_method=self.parameter['sig2noise_method'],
+                correlation_method=self.parameter['corr_method'],
+                normalized_correlation=self.parameter['normalize_correlation'])
+            with stage(self.timer, 'correlation pass 1'):
+                if self.tiles is not None:
+                    # spectra of bands are not cached
+                    u, v, sig2noise = self.tiles.correlate(
+                        self.correlation.correlate,
+                        frame_a,
+                        frame_b,
+                        corr_window_0,
+                        overlap_0,
+                        **options)
                 else:
-                    if self.parameter['grid_refinement'] == 'all passes' or \
-                            self.parameter['grid_refinement'] == '2nd pass on':
-                        corr_window = self.parameter['corr_window'] * \
-                            2**(iterations - 1)
-                        overlap = self.parameter['overlap'] * \
-                            2**(iterations - 1)
-
-                    else:
-                        corr_window = self.parameter['corr_window']
-                        overlap = self.parameter['overlap']
-                sizeX = corr_window
+                    u, v, sig2noise = self.correlation.correlate(
+                        frame_a,
+                        frame_b,
+                        window_size=corr_window_0,
+                        overlap=overlap_0,
+                        key_a=key_a,
+                        key_b=key_b,
+                        **options)
 
-                # translate settings to windef settings object
-                piv_wdf_settings = piv_wdf.PIVSettings()
-                piv_wdf_settings.correlation_method = \
-                    self.parameter['corr_method']
-                piv_wdf_settings.normalized_correlation = \
-                    self.parameter['normalize_correlation']
-                piv_wdf_settings.windowsizes = (corr_window,) * (passes + 1)
-                piv_wdf_settings.overlap = (overlap,) * (passes + 1)
-                piv_wdf_settings.num_iterations = passes
-                piv_wdf_settings.subpixel_method = \
-                    self.parameter['subpixel_method']
-                piv_wdf_settings.deformation_method = \
-                    self.parameter['deformation_method']
-                piv_wdf_settings.interpolation_order = \
-                    self.parameter['interpolation_order']
-                piv_wdf_settings.sig2noise_validate = True,
-                piv_wdf_settings.sig2noise_method = \
-                    self.parameter['sig2noise_method']
-                piv_wdf_settings.sig2noise_mask = self.parameter['s2n_mask']
+            x, y = plan.grid(frame_a.shape)
 
-                # do the correlation
-                x, y, u, v, sig2noise, mask = piv_wdf.multipass_img_deform(
-                    frame_a.astype(np.int32),
-                    frame_b.astype(np.int32),
-                    i,  # current iteration
-                    x, y, u, v,
-                    piv_wdf_settings)
+            # validating first pass
+            mask = np.zeros_like(x, dtype=bool)
+            u = np.ma.copy(u)
+            v = np.ma.copy(v)
 
-                # validate other passes
-                if self.parameter['sp_vld_global_threshold']:
+            with stage(self.timer, 'validation pass 1'):
+                if self.parameter['fp_vld_global_threshold']:
                     Mask = piv_vld.global_val(
                         u, v,
-                        u_thresholds=(self.parameter['sp_MinU'],
-                                      self.parameter['sp_MaxU']),
-                        v_thresholds=(self.parameter['sp_MinV'],
-                                      self.parameter['sp_MaxV']))
-                    mask += Mask  # consolidate effects of mask
-
-                if self.parameter['sp_vld_global_threshold']:
-                    Mask = piv_vld.global_std(
-                        u, v,
-                        std_threshold=self.parameter['sp_std_threshold'])
+                        u_thresholds=(self.parameter['fp_MinU'],
+                                      self.parameter['fp_MaxU']),
+                        v_thresholds=(self.parameter['fp_MinV'],
+                                      self.parameter['fp_MaxV']))
+                    # consolidate effects of mask
                     mask += Mask
 
-                if self.parameter['sp_local_med_validation']:
+                if self.parameter['fp_local_med']:
                     Mask = piv_vld.local_median_val(
                         u, v,
-                        u_threshold=self.parameter['sp_local_med'],
-                        v_threshold=self.parameter['sp_local_med'],
-                        size=self.parameter['sp_local_med_size'])
+                        u_threshold=self.parameter['fp_local_med'],
+                        v_threshold=self.parameter['fp_local_med'],
+                        size=self.parameter['fp_local_med_size'])
                     mask += Mask
 
+            with stage(self.timer, 'replacement pass 1'):
                 if self.parameter['adv_repl']:
                     u, v = piv_flt.replace_outliers(
                         u, v, mask,
                         method=self.parameter['adv_repl_method'],
                         max_iter=self.parameter['adv_repl_iter'],
                         kernel_size=self.parameter['adv_repl_kernel'])
-                print('Validated pass {} of image pair: {}.'
-                      .format(i, counter + 1))
+            print('Validated first pass result of image pair: {}.'
+                  .format(counter + 1))
 
-                # smoothning each individual pass if 'each pass' is selected
+            # smoothning  before deformation if 'each pass' is selected
+            with stage(self.timer, 'smoothing pass 1'):
                 if self.parameter['smoothn_each_pass']:
+                    if self.parameter['smoothn_first_more']:
+                        s *= 2
                     u = smoothn(u, s)
                     v = smoothn(v, s)
-                    print('Smoothned pass {} for image pair: {}.'
-                          .format(i, counter + 1))
+                    print('Smoothned pass 1 for image pair: {}.'
+                          .format(counter + 1))
+                    s = self.parameter['smoothn_val1']
+
+            print('Finished pass 1 for image pair: {}.'.format(counter + 1))
+            self.report('pass', counter, passes=passes,
+                        elapsed=time.time() - started, **{'pass': 1})
+            print("window size: " + str(corr_window_0))
+            print('overlap: ' + str(overlap_0), '\n')
+        else:
+            first_pass, x, y, u, v = warm
+            used = []
+            if self.parameter['smoothn_each_pass']:
+                s = self.parameter['smoothn_val1']
+            print('Starting image pair {} from the field of pair {} at '
+                  'pass {}.'.format(counter + 1, counter, first_pass))
+
+        # evaluation of all other passes
+        if self.tiles is not None:
+            multipass_img_deform = self.tiles.multipass_img_deform
+        else:
+            multipass_img_deform = piv_wdf.multipass_img_deform
+        threshold = self.parameter['convergence_threshold']
+        converged = False
+        changes = []
+        if passes != 1:
+            for i in range(first_pass, passes + 1):
+                # after convergence, continue with the final grid
+                if converged and i < passes:
+                    continue
+                self.check_cancelled()
+                field = x, y, u, v
+                corr_window = plan.windows[i - 1]
+                overlap = plan.overlaps[i - 1]
+                sizeX = corr_window
+
+                # do the correlation
+                with stage(self.timer, 'correlation pass %d' % i):
+                    x, y, u, v, sig2noise, mask = multipass_img_deform(
+                        frame_a,
+                        frame_b,
+                        i,  # current iteration
+                        x, y, u, v,
+                        plan.settings[i - 1])
+
+                # validate other passes
+                with stage(self.timer, 'validation pass %d' % i):
+                    if self.parameter['sp_vld_global_threshold']:
+                        Mask = piv_vld.global_val(
+                            u, v,
+                            u_thresholds=(self.parameter['sp_MinU'],
+                                          self.parameter['sp_MaxU']),
+                            v_thresholds=(self.parameter['sp_MinV'],
+                                          self.parameter['sp_MaxV']))
+                        mask += Mask  # consolidate effects of mask
+
+                    if self.parameter['sp_vld_global_threshold']:
+                        Mask = piv_vld.global_std(
+                            u, v,
+                            std_threshold=self.parameter['sp_std_threshold'])
+                        mask += Mask
+
+                    if self.parameter['sp_local_med_validation']:
+                        Mask = piv_vld.local_median_val(
+                            u, v,
+                            u_threshold=self.parameter['sp_local_med'],
+                            v_threshold=self.parameter['sp_local_med'],
+                            size=self.parameter['sp_local_med_size'])
+                        mask += Mask
+
+                with stage(self.timer, 'replacement pass %d' % i):
+                    if self.parameter['adv_repl']:
+                        u, v = piv_flt.replace_outliers(
+                            u, v, mask,
+                            method=self.parameter['adv_repl_method'],
+                            max_iter=self.parameter['adv_repl_iter'],
+                            kernel_size=self.parameter['adv_repl_kernel'])
+                print('Validated pass {} of image pair: {}.'
+                      .format(i, counter + 1))
+
+                # smoothning each individual pass if 'each pass' is selected
+                with stage(self.timer, 'smoothing pass %d' % i):
+                    if self.parameter['smoothn_each_pass']:
+                        u = smoothn(u, s)
+                        v = smoothn(v, s)
+                        print('Smoothned pass {} for image pair: {}.'
+                              .format(i, counter + 1))
 
                 print('Finished pass {} for image pair: {}.'
                       .format(i, counter + 1))
+                self.report('pass', counter, passes=passes,
+                            elapsed=time.time() - started, **{'pass': i})
                 print("window size: " + str(corr_window))
                 print('overlap: ' + str(overlap), '\n')
-                iterations -= 1
+                used.append(i)
 
-        if self.p['flip_u']:
-            u = np.flipud(u)
+                if threshold > 0 and i < passes and not converged:
+                    changes.append(field_change(field, (x, y, u, v)))
+                    converged = changes[-1] < threshold
+                    if converged:
+                        print('Pass {} of image pair {} converged (RMS '
+                              'change {:.4f} px).'.format(
+                                  i, counter + 1, changes[-1]))
+                        if corr_window == plan.windows[-1] \
+                                and overlap == plan.overlaps[-1]:
+                            # the grid is final already
+                            break
 
-        if self.p['flip_v']:
-            v = np.flipud(v)
+        if self.p['warm_start']:
+            self.previous = (counter, x, y, np.ma.copy(u), np.ma.copy(v))
 
-        if self.p['invert_u']:
-            u *= -1
+        with stage(self.timer, 'scaling'):
+            if self.p['flip_u']:
+                u = np.flipud(u)
 
-        if self.p['invert_v']:
-            v *= -1
+            if self.p['flip_v']:
+                v = np.flipud(v)
 
-        # scaling
-        u = u / self.parameter['dt']
-        v = v / self.parameter['dt']
-        x, y, u, v = piv_scl.uniform(x, y, u, v,
-                                     scaling_factor=self.parameter['scale'])
-        end = time.time()
+            if self.p['invert_u']:
+                u *= -1
 
-        # save data to file.
-        out = np.vstack([m.ravel() for m in [x, y, u, v, mask, sig2noise]])
-        np.savetxt(self.save_fnames[counter], out.T, fmt='%8.4f',
-                   delimiter=delimiter)
-        print('Processed image pair: {}'.format(counter + 1))
+            if self.p['invert_v']:
+                v *= -1
+
+            # scaling
+            u = u / self.parameter['dt']
+            v = v / self.parameter['dt']
+            x, y, u, v = piv_scl.uniform(
+                x, y, u, v, scaling_factor=self.parameter['scale'])
+            if self.p['float32']:
+                x, y, u, v, sig2noise = (
+                    a.astype(np.float32)
+                    for a in (x, y, u, v, sig2noise))
+        end = time.time()
 
         sizeY = sizeX
         sizeX = ((int(frame_a.shape[0] - sizeX)
@@ -406,3 +1291,27 @@ class MultiProcessing(piv_tls.Multiprocesser):
         print('Process time: {} second(s)'.format((_round((end - start), 3))))
         print('Number of vectors: {}'.format(int((sizeX * sizeY) - 1)))
         print('Time per vector: {} millisecond(s)'.format(time_per_vec))
+        self.report('done', counter, elapsed=time.time() - started,
+                    vectors=int(np.size(u)), passes=used, changes=changes)
+        return counter, x, y, u, v, mask, sig2noise
+
+    def save_result(self, result):
+        """
+            Save the result of evaluate.
+
+            Parameters
+            ----------
+            result : tuple
+                counter, x, y, u, v, mask, sig2noise
+        """
+        counter, x, y, u, v, mask, sig2noise = result
+        # delimiters placed here for safety
+        delimiter = self.p['separator']
+        if delimiter == 'tab':
+            delimiter = '\t'
+        if delimiter == 'space':
+            delimiter = ' '
+        with stage(self.timer, 'write'):
+            save(x, y, u, v, mask, sig2noise, self.save_fnames[counter],
+                 delimiter=delimiter)
+        print('Processed image pair: {}'.format(counter + 1))
@@ -4,12 +4,15 @@
 """A simple GUI for OpenPIV."""
 
 import openpivgui.vec_plot as vec_plot
-from openpivgui.open_piv_gui_tools import str2list, str2dict, get_dim, _round
+from openpivgui.open_piv_gui_tools import str2list, str2dict, get_dim, \
+    load, _round
 from openpivgui.ErrorChecker import check_PIVprocessing, check_processing, \
     check_postprocessing
 from openpivgui.PostProcessing import PostProcessing
 from openpivgui.PreProcessing import gen_background, process_images
+from openpivgui.SlidingBackground import METHODS
 from openpivgui.MultiProcessing import MultiProcessing
+from openpivgui.Progress import Progress
 from openpivgui.CreateToolTip import CreateToolTip
 from openpivgui.OpenPivParams import OpenPivParams
 import openpivgui.AddInHandler as AddInHandler
@@ -27,6 +30,7 @@ from tkinter import colorchooser
 from datetime import datetime
 import threading
 import shutil
+import queue
 import webbrowser
 import tkinter.messagebox as messagebox
 import tkinter.ttk as ttk
@@ -159,6 +163,8 @@ class OpenPivGui(tk.Tk):
         self.ta = {}
         # handle for list-box
         self.lb = None
+        # MultiProcessing object of a running PIV evaluation
+        self.mp = None
         print('Initializing widgets')
         # Initializing the addin parameters and methods
         AddInHandler.init_add_ins(self)
@@ -178,9 +184,40 @@ class OpenPivGui(tk.Tk):
             check_PIVprocessing(self.p)
             self.processing_thread = threading.Thread(target=self.processing)
             self.processing_thread.start()
+            self.after(250, self.poll_progress)
         except Exception as e:
             print('PIV evaluation thread stopped. ' + str(e))
 
+    def poll_progress(self, progress=None):
+        """
+            Show the progress events of a running PIV evaluation.
+
+            Runs in the Tk thread and reschedules itself, as long as
+            the processing thread is alive.
+
+            Parameters
+            ----------
+            progress : openpivgui.Progress
+                Progress collected so far.
+        """
+        mp = self.mp
+        if mp is not None:
+            if progress is None:
+                progress = Progress(mp.get_num_frames())
+            try:
+                while True:
+                    progress.update(mp.events.get_nowait())
+            except queue.Empty:
+                pass
+            if progress.done > 0:
+                self.progressbar.stop()
+                self.progressbar.config(mode='determinate',
+                                        maximum=max(1, progress.total),
+                                        value=progress.done)
+                self.process_type.config(text=progress.summary())
+        if self.processing_thread.is_alive():
+            self.after(250, self.poll_progress, progress)
+
     def processing(self):
         try:
             self.log(timestamp=True,
@@ -194,10 +231,12 @@ class OpenPivGui(tk.Tk):
 
             # parallel PIV evaluation:
             print('Starting evaluation.')
+            self.progressbar.config(mode='indeterminate')
             self.progressbar.start()
 
             self.get_settings()
             mp = MultiProcessing(self)
+            self.mp = mp
 
             number_of_frames = mp.get_num_frames()
             self.process_type.config(text='Processing {} PIV image pair(s)'
@@ -228,17 +267,32 @@ class OpenPivGui(tk.Tk):
             print('Cores left: {} of {}.'.format(
                 (os.cpu_count() - cpu_count), os.cpu_count()))
 
-            mp.run(func=mp.process, n_cpus=cpu_count)
+            mp.run(n_cpus=cpu_count)
+            # stop showing the progress
+            self.mp = None
+
+            if mp.cancelled:
+                # keep the results written before cancelling
+                return_fnames = [f for f in return_fnames
+                                 if os.path.isfile(f)]
 
             # update file list with result vector files:
             self.tkvars['fnames'].set(return_fnames)
-            self.log(timestamp=True,
-                     text='\nPIV evaluation finished.',
-                     group=self.p.PIVPROC)
-
             self.progressbar.stop()
-            self.process_type.config(text='Processed {} PIV image pair(s)'
-                                     .format(number_of_frames))
+            if mp.cancelled:
+                self.log(timestamp=True,
+                         text='\nPIV evaluation cancelled.',
+                         group=self.p.PIVPROC)
+                self.process_type.config(
+                    text='Cancelled, {} of {} PIV image pair(s) processed'
+                    .format(len(return_fnames), number_of_frames))
+            else:
+                self.log(timestamp=True,
+                         text='\nPIV evaluation finished.',
+                         group=self.p.PIVPROC)
+                self.process_type.config(
+                    text='Processed {} PIV image pair(s)'
+                    .format(number_of_frames))
 
             # update file count
             self.get_settings()
@@ -247,6 +301,15 @@ class OpenPivGui(tk.Tk):
             print('PIV evaluation thread stopped. ' + str(e))
             self.progressbar.stop()
             self.process_type.config(text='Failed to process image pair(s)')
+        finally:
+            self.mp = None
+
+    def stop_processing(self):
+        """Cancel a running PIV evaluation, keeping finished results."""
+        if self.mp is not None:
+            print('Cancelling evaluation. Please wait.')
+            self.process_type.config(text='Cancelling...')
+            self.mp.cancel()
 
     def start_postprocessing(self):
         """Wrapper function to start processing in a separate thread."""
@@ -265,6 +328,7 @@ class OpenPivGui(tk.Tk):
 
     def postprocessing(self):
         try:
+            self.progressbar.config(mode='indeterminate')
             self.progressbar.start()
             self.process_type.config(text='Processing {} PIV result(s)'
                                      .format(len(self.p['fnames'])))
@@ -455,6 +519,9 @@ class OpenPivGui(tk.Tk):
         ttk.Button(self.fig_frame,
                    text='start processing',
                    command=self.start_processing).pack(side='left')
+        ttk.Button(self.fig_frame,
+                   text='stop processing',
+                   command=self.stop_processing).pack(side='left')
         ttk.Button(self.fig_frame,
                    text='start postprocessing',
                    command=self.start_postprocessing).pack(side='left')
@@ -744,6 +811,10 @@ class OpenPivGui(tk.Tk):
                                sep=sep,
                                header=0 if skip_rows != 0 else None,
                                names=names)
+        elif ext == 'npz':
+            data = pd.DataFrame(load(fname),
+                                columns=['x', 'y', 'vx', 'vy',
+                                         'val-1', 'val-2'])
         else:
             data = 'File could not be read. Possibly it is an image file.'
         return data
@@ -1217,7 +1288,8 @@ class OpenPivGui(tk.Tk):
             Display a file.
 
             This method distinguishes vector data (file extensions
-            txt, dat, jvc,vec and csv) and images (all other file extensions).
+            txt, dat, jvc, vec, csv and npz) and images (all other file
+            extensions).
 
             Parameters
             ----------
@@ -1227,7 +1299,7 @@ class OpenPivGui(tk.Tk):
         ext = fname.split('.')[-1]
         self.fig.clear()
         data = self.load_pandas(fname)
-        if ext in ['txt', 'dat', 'jvc', 'vec', 'csv']:
+        if ext in ['txt', 'dat', 'jvc', 'vec', 'csv', 'npz']:
             if self.p['plot_type'] == 'vectors':
                 vec_plot.vector(
                     data,
@@ -1288,6 +1360,10 @@ class OpenPivGui(tk.Tk):
         img = img.astype(np.int32)
         # generate background if needed
         if self.p['background_subtract'] and \
+                self.p['background_type'] in METHODS:
+            background = gen_background(self.p, fname=fname)
+
+        elif self.p['background_subtract'] and \
                 self.p['background_type'] != 'minA - minB':
             background = gen_background(self.p)
 
@@ -150,21 +150,151 @@ class OpenPivParams:
 
             'navi_pattern':
                 [1110, 'sub',
-                 'png$, tif$, bmp$, pgm$, vec$, ' +
-                 r'DCC_[0-9]+\.vec$, ' +
-                 r'FFT_[0-9]+\.vec$, ' +
-                 r'sig2noise\.vec$, ' +
-                 r'std_thrhld\.vec, ' +
-                 r'med_thrhld\.vec, ' +
-                 r'glob_thrhld\.vec, ' +
-                 r'repl\.vec$, ' +
-                 r'smthn\.vec$ ',
+                 'png$, tif$, bmp$, pgm$, vec$, npz$, ' +
+                 r'DCC_[0-9]+\.(vec|npz)$, ' +
+                 r'FFT_[0-9]+\.(vec|npz)$, ' +
+                 r'sig2noise\.(vec|npz)$, ' +
+                 r'std_thrhld\.(vec|npz), ' +
+                 r'med_thrhld\.(vec|npz), ' +
+                 r'glob_thrhld\.(vec|npz), ' +
+                 r'repl\.(vec|npz)$, ' +
+                 r'smthn\.(vec|npz)$ ',
                  None,
                  'navigation pattern',
                  'Regular expression patterns for filtering the files ' +
                  'in the current directory. Use the back and forward ' +
                  'buttons to apply a different filter.'],
 
+            'performance_sub_frame':
+                [1200, 'sub_labelframe', None,
+                 None,
+                 'performance',
+                 None],
+
+            'pipeline':
+                [1205, 'sub_bool', False, None,
+                 'streaming pipeline',
+                 'Decode images in reader threads and write results in ' +
+                 'a separate thread, while the worker processes evaluate. ' +
+                 'Useful if the images are on a slow (network) drive.'],
+
+            'reader_threads':
+                [1210, 'sub_int', 2, None,
+                 'reader threads',
+                 'Number of threads decoding images in the streaming ' +
+                 'pipeline.'],
+
+            'pipeline_depth':
+                [1215, 'sub_int', 8, None,
+                 'pairs in flight',
+                 'Maximum number of image pairs held between reading and ' +
+                 'writing in the streaming pipeline. Limits the memory ' +
+                 'usage.'],
+
+            'timing':
+                [1220, 'sub_bool', False, None,
+                 'stage timing',
+                 'Record wall and CPU time of reading, each preprocessing ' +
+                 'step and AddIn, each correlation pass, validation, ' +
+                 'replacement, smoothing and writing. The timings are ' +
+                 'saved per image pair in <base output filename>' +
+                 '_timing.jsonl, a summary in ..._timing_summary.json.'],
+
+            'profile':
+                [1225, 'sub_bool', False, None,
+                 'profile workers',
+                 'Run a sample of the image pairs under cProfile. The ' +
+                 'statistics of all workers are merged into <base ' +
+                 'output filename>_profile.prof, which can be read with ' +
+                 'pstats or snakeviz.'],
+
+            'profile_every':
+                [1230, 'sub_int', 10, None,
+                 'profile every n-th pair',
+                 'Profile the first and then every n-th image pair.'],
+
+            'profile_memory':
+                [1235, 'sub_bool', False, None,
+                 'profile memory',
+                 'Trace the memory allocations of the profiled pairs ' +
+                 'with tracemalloc. The peak memory of each stage is ' +
+                 'written to ..._profile_memory.txt. Tracing slows ' +
+                 'down the profiled pairs considerably.'],
+
+            'memory_budget':
+                [1240, 'sub_float', 0.0, None,
+                 'memory budget [GB]',
+                 'Memory the PIV evaluation may use. The number of ' +
+                 'worker processes is reduced, if the estimated peak ' +
+                 'memory of the workers exceeds it. The estimate is ' +
+                 'based on the size of the first image and the window ' +
+                 'sizes of all passes. With 0, 80 % of the memory ' +
+                 'available at the start is used.'],
+
+            'worker_threads':
+                [1245, 'sub_int', 0, None,
+                 'threads per worker',
+                 'Number of BLAS/OpenMP threads of each worker process. ' +
+                 'With 0, the cores are shared evenly between the ' +
+                 'workers, to avoid more threads than cores. Limiting ' +
+                 'libraries already loaded by forked workers requires ' +
+                 'the package threadpoolctl.'],
+
+            'fft_threads':
+                [1250, 'sub_bool', False, None,
+                 'FFT threads for few pairs',
+                 'If fewer image pairs than cores are processed, start ' +
+                 'one process per pair and compute the FFTs of all ' +
+                 'passes with the remaining cores (scipy.fft).'],
+
+            'tile_bands':
+                [1255, 'sub_int', 0, None,
+                 'bands per pair',
+                 'Split the interrogation grid of each image pair into ' +
+                 'this many horizontal bands, evaluated by parallel ' +
+                 'threads. Useful for single, very large image pairs. ' +
+                 'The results do not change. 0 or 1 disables the bands.'],
+
+            'out_of_core':
+                [1260, 'sub_bool', False, None,
+                 'out-of-core tiles',
+                 'For images larger than the memory: map the images ' +
+                 '(.npy, binary .pgm, uncompressed .tif with tifffile) ' +
+                 'into memory and preprocess, deform and correlate them ' +
+                 'in tiles of rows. Intermediate frames are kept in ' +
+                 'temporary files. The streaming pipeline is not used.'],
+
+            'tile_rows':
+                [1265, 'sub_int', 2048, None,
+                 'image rows per tile',
+                 'Height of the tiles of the out-of-core evaluation.'],
+
+            'tile_halo':
+                [1270, 'sub_int', 64, None,
+                 'tile halo of AddIns',
+                 'Rows added above and below each tile, when running ' +
+                 'preprocessing AddIns out-of-core. Filters with a ' +
+                 'larger reach give slightly different results at the ' +
+                 'tile borders.'],
+
+            'background_cache':
+                [1275, 'sub_bool', True, None,
+                 'cache backgrounds',
+                 'Keep the last two global backgrounds in memory. A ' +
+                 'background is reused by later runs and the image ' +
+                 'preview, as long as the images, their modification ' +
+                 'times and the settings are unchanged.'],
+
+            'background_disk_cache':
+                [1280, 'sub_bool', False, None,
+                 'cache backgrounds on disk',
+                 'Also store cached backgrounds as .npy files in ' +
+                 '~/.openpivgui/backgrounds, so they are reused after ' +
+                 'restarting. Each file is a float64 image (8 bytes per ' +
+                 'pixel, e.g. 200 MB at 25 megapixels). The least ' +
+                 'recently used files are removed beyond 16 files or ' +
+                 '2 GB.'],
+
             'save_sub_frame':
                 [1300, 'sub_labelframe', None,
                  None,
@@ -178,11 +308,27 @@ class OpenPivParams:
                  'that indicates the process history are added ' +
                  'automatically.'],
 
+            'save_format':
+                [1315, 'sub', 'vec', ('vec', 'npz'),
+                 'file format',
+                 'Format of the result files. »vec« writes text columns. ' +
+                 '»npz« writes x, y, u, v, mask and sig2noise as binary ' +
+                 'float32 arrays along with the grid shape, which is ' +
+                 'smaller, more precise and much faster to read and write.'],
+
             'separator':
                 [1320, 'sub', 'tab', (',', ';', 'space', 'tab'),
                  'delimiter',
                  'Delimiter.'],
 
+            'resume':
+                [1325, 'sub_bool', False, None,
+                 'resume',
+                 'Skip image pairs whose results are up to date. Each ' +
+                 'result is recorded in a manifest file along with a hash ' +
+                 'of the processing parameters and the state of the ' +
+                 'images. Pairs are processed again, if anything changed.'],
+
             'image_plotting_sub_frame':
                 [1500, 'sub_labelframe', None,
                  None,
@@ -236,12 +382,22 @@ class OpenPivParams:
                  'Subtract background via local sliding windows.'],
 
             'background_type':
-                [2031, 'str', 'global mean', ('global mean', 'minA - minB'),
+                [2031, 'str', 'global mean', ('global mean',
+                                              'global percentile',
+                                              'minA - minB',
+                                              'sliding min', 'sliding mean',
+                                              'sliding percentile'),
                  'background algorithm',
                  'The algorithm used to generate the background which is subtracted ' +
                  'from the piv images. ' +
                  'Warning: »minA - minB« is still in development, so it may not perform ' +
-                 'to standard.'],
+                 'to standard. ' +
+                 '»global percentile« (e.g. the median) removes ' +
+                 'reflections better than the mean; the images are ' +
+                 'held in a temporary file instead of the memory ' +
+                 '(see »percentile stack directory«). ' +
+                 'The sliding algorithms use the neighbouring images of ' +
+                 'each image and follow slowly drifting illumination.'],
 
             'starting_frame':
                 [2032, 'int', 0, None,
@@ -253,8 +409,30 @@ class OpenPivParams:
                  'ending image',
                  'Defining the ending image of the background subtraction.'],
 
+            'background_window':
+                [2034, 'int', 5, None,
+                 'sliding window',
+                 'Number of images before and after each image, which ' +
+                 'the sliding backgrounds are computed from.'],
+
+            'background_percentile':
+                [2035, 'float', 50.0, None,
+                 'background percentile',
+                 'Percentile of the »global percentile« and »sliding ' +
+                 'percentile« backgrounds, e.g. 50 for the median.'],
+
+            'background_stack_dir':
+                [2037, 'str', '', None,
+                 'percentile stack directory',
+                 'Directory of the temporary file holding the decoded ' +
+                 'images of the »global percentile« background. It ' +
+                 'needs as much space as the images from the starting ' +
+                 'to the ending image take decoded, e.g. 50 GB for ' +
+                 '1000 images of 25 megapixels at 16 bit. If empty, ' +
+                 'the directory of the images is used.'],
+
             'crop_ROI_spacer':
-                [2035, 'h-spacer', None,
+                [2036, 'h-spacer', None,
                  None,
                  None,
                  None],
@@ -379,6 +557,41 @@ class OpenPivParams:
                  'normalize correlation',
                  'Normalize correlation.'],
 
+            'convergence_threshold':
+                [3051, 'float', 0.0, None,
+                 'convergence threshold [px]',
+                 'Adaptive number of passes: if the RMS change of the ' +
+                 'displacements between two passes falls below this ' +
+                 'value, the intermediate passes are skipped and the ' +
+                 'final pass is evaluated, or the evaluation stops, if ' +
+                 'the final window size is reached already. The passes ' +
+                 'used per pair are saved in <base output filename>' +
+                 '_passes.jsonl. 0 disables the adaptive mode.'],
+
+            'float32':
+                [3052, 'bool', False, None,
+                 'float32 processing',
+                 'Keep frames, deformed frames, correlations and results ' +
+                 'in single precision instead of float64 and int32. ' +
+                 'Halves the memory traffic. The frames keep their ' +
+                 'fractional grey values, so results differ slightly ' +
+                 'from the default evaluation (see documentation).'],
+
+            'warm_start':
+                [3053, 'bool', False, None,
+                 'warm start',
+                 'For time resolved sequences: start the evaluation of ' +
+                 'a pair from the final field of the previous pair, ' +
+                 'skipping coarse passes. Pairs processed by another ' +
+                 'worker than their predecessor start from scratch, so ' +
+                 'the results depend on the number of cores.'],
+
+            'warm_start_passes':
+                [3054, 'int', 1, None,
+                 'skipped passes',
+                 'Number of coarse passes skipped with warm start. At ' +
+                 'least the final pass is always evaluated.'],
+
             'calibration_spacer':
                 [3055, 'h-spacer', None,
                  None,
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Memory mapped images for frames larger than the available memory."""
+
+import tempfile
+import os
+import numpy as np
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+__licence__ = '''
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+__email__ = 'vennemann@fh-muenster.de'
+
+
+def _read_pnm_header(f):
+    """Return width, height, maxval and data offset of a binary PGM."""
+    if f.read(2) != b'P5':
+        return None
+    fields = []
+    while len(fields) < 3:
+        char = f.read(1)
+        if not char:
+            return None
+        if char == b'#':
+            f.readline()
+        elif not char.isspace():
+            token = char
+            while True:
+                char = f.read(1)
+                if not char or char.isspace():
+                    break
+                token += char
+            fields.append(int(token))
+    # exactly one whitespace character follows maxval
+    return fields[0], fields[1], fields[2], f.tell()
+
+
+def open_image(fname):
+    """
+        Map the pixels of an image file into memory without reading them.
+
+        Supported are NumPy files (.npy), binary PGM files and, if the
+        package tifffile is installed, uncompressed TIFF files.
+
+        Parameters
+        ----------
+        fname : str
+            Image file.
+
+        Returns
+        -------
+        np.memmap
+            Read-only 2D array or None, if the file cannot be mapped.
+    """
+    ext = os.path.splitext(fname)[1].lower()
+    image = None
+    try:
+        if ext == '.npy':
+            image = np.load(fname, mmap_mode='r')
+        elif ext in ('.pgm', '.pnm'):
+            with open(fname, 'rb') as f:
+                header = _read_pnm_header(f)
+            if header is not None:
+                width, height, maxval, offset = header
+                dtype = np.uint8 if maxval < 256 else np.dtype('>u2')
+                image = np.memmap(fname, dtype=dtype, mode='r',
+                                  offset=offset, shape=(height, width))
+        elif ext in ('.tif', '.tiff') and tifffile is not None:
+            image = tifffile.memmap(fname, mode='r')
+    except (ValueError, OSError):
+        return None
+    if image is None or image.ndim != 2:
+        return None
+    return image
+
+
+def scratch_array(shape, dtype):
+    """
+        Return an array backed by an anonymous temporary file.
+
+        The operating system pages the data out as needed. The file is
+        removed, when the array is no longer referenced.
+    """
+    with tempfile.TemporaryFile(prefix='openpivgui-') as f:
+        # the memory map keeps its own handle of the file
+        return np.memmap(f, dtype=dtype, mode='w+', shape=shape)
+
+
+def row_tiles(start, stop, tile_rows):
+    """Return (top, bottom) of consecutive blocks of tile_rows rows."""
+    tile_rows = max(1, tile_rows)
+    return [(top, min(top + tile_rows, stop))
+            for top in range(start, stop, tile_rows)]
+
+
+def image_maximum(image, tile_rows):
+    """Return the maximum of an image, reading tile_rows rows at a time."""
+    return max(image[top:bottom].max()
+               for top, bottom in row_tiles(0, image.shape[0], tile_rows))
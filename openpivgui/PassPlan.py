@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Window sizes, overlaps and OpenPIV settings of all evaluation passes."""
+
+from scipy.interpolate import RectBivariateSpline
+import numpy as np
+import openpiv.windef as piv_wdf
+
+__licence__ = '''
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+__email__ = 'vennemann@fh-muenster.de'
+
+
+def field_change(previous, current):
+    """
+        Return the RMS change of the displacements between two passes.
+
+        The field of the previous pass is interpolated to the grid of
+        the current pass, like the predictor in openpiv.windef.
+
+        Parameters
+        ----------
+        previous, current : tuple
+            x, y, u, v of a pass, in pixels.
+
+        Returns
+        -------
+        float
+            RMS of the vector differences in pixels, NaN if there are no
+            valid vectors.
+    """
+    x_old, y_old, u_old, v_old = previous
+    x, y, u, v = current
+    if u_old.shape == u.shape:
+        u_pre, v_pre = u_old, v_old
+    else:
+        order = [min(3, n - 1) for n in u_old.shape]
+        u_pre = RectBivariateSpline(
+            y_old[:, 0], x_old[0, :], np.ma.filled(u_old, 0.),
+            kx=order[0], ky=order[1])(y[:, 0], x[0, :])
+        v_pre = RectBivariateSpline(
+            y_old[:, 0], x_old[0, :], np.ma.filled(v_old, 0.),
+            kx=order[0], ky=order[1])(y[:, 0], x[0, :])
+    change = np.ma.masked_invalid((u - u_pre)**2 + (v - v_pre)**2)
+    if change.count() == 0:
+        return float('nan')
+    return float(np.sqrt(change.mean()))
+
+
+class PassPlan:
+    """
+        The pass schedule of a run, evaluated once from the parameters.
+
+        The schedule is the same for every image pair, so it is built
+        in MultiProcessing.__init__ and reused by the workers.
+
+        Parameters
+        ----------
+        parameter : dict
+            Processing parameters, as collected by MultiProcessing.
+
+        Attributes
+        ----------
+        passes : int
+            Number of evaluation passes.
+        windows : int[]
+            Interrogation window size of each pass.
+        overlaps : int[]
+            Overlap of each pass.
+        settings : openpiv.windef.PIVSettings[]
+            Settings of each pass, None for the first pass.
+        overlap_percent : float
+            Overlap of the first pass relative to its window size.
+    """
+
+    def __init__(self, parameter):
+        self.parameter = parameter
+        self.passes = 1
+        # setup custom windowing if selected
+        if parameter['custom_windowing']:
+            corr_window_0 = parameter['corr_window_1']
+            overlap_0 = parameter['overlap_1']
+            for i in range(2, 8):
+                if parameter['pass_%1d' % i]:
+                    self.passes += 1
+                else:
+                    break
+
+        else:
+            self.passes = parameter['coarse_factor']
+            if parameter['grid_refinement'] == 'all passes' \
+                    and parameter['coarse_factor'] != 1:
+                corr_window_0 = parameter['corr_window'] * \
+                    2**(parameter['coarse_factor'] - 1)
+                overlap_0 = parameter['overlap'] * \
+                    2**(parameter['coarse_factor'] - 1)
+
+            # Refine all passes after first when there are more than 1 pass.
+            elif parameter['grid_refinement'] == '2nd pass on' \
+                    and parameter['coarse_factor'] != 1:
+                corr_window_0 = parameter['corr_window'] * \
+                    2**(parameter['coarse_factor'] - 2)
+                overlap_0 = parameter['overlap'] * \
+                    2**(parameter['coarse_factor'] - 2)
+
+            # If >>none<< is selected or something goes wrong, the window
+            # size would remain the same.
+            else:
+                corr_window_0 = parameter['corr_window']
+                overlap_0 = parameter['overlap']
+        self.overlap_percent = overlap_0 / corr_window_0
+
+        self.windows = [corr_window_0]
+        self.overlaps = [overlap_0]
+        self.settings = [None]
+        iterations = self.passes - 1
+        for i in range(2, self.passes + 1):
+            # setting up the windowing of each pass
+            if parameter['custom_windowing']:
+                corr_window = parameter['corr_window_%1d' % i]
+                overlap = int(corr_window * self.overlap_percent)
+
+            else:
+                if parameter['grid_refinement'] == 'all passes' or \
+                        parameter['grid_refinement'] == '2nd pass on':
+                    corr_window = parameter['corr_window'] * \
+                        2**(iterations - 1)
+                    overlap = parameter['overlap'] * \
+                        2**(iterations - 1)
+
+                else:
+                    corr_window = parameter['corr_window']
+                    overlap = parameter['overlap']
+            self.windows.append(corr_window)
+            self.overlaps.append(overlap)
+            self.settings.append(self._settings(corr_window, overlap))
+            iterations -= 1
+        self.grids = {}
+
+    def _settings(self, corr_window, overlap):
+        """Translate the settings of a pass to a windef settings object."""
+        piv_wdf_settings = piv_wdf.PIVSettings()
+        piv_wdf_settings.correlation_method = \
+            self.parameter['corr_method']
+        piv_wdf_settings.normalized_correlation = \
+            self.parameter['normalize_correlation']
+        piv_wdf_settings.windowsizes = (corr_window,) * (self.passes + 1)
+        piv_wdf_settings.overlap = (overlap,) * (self.passes + 1)
+        piv_wdf_settings.num_iterations = self.passes
+        piv_wdf_settings.subpixel_method = \
+            self.parameter['subpixel_method']
+        piv_wdf_settings.deformation_method = \
+            self.parameter['deformation_method']
+        piv_wdf_settings.interpolation_order = \
+            self.parameter['interpolation_order']
+        piv_wdf_settings.sig2noise_validate = True,
+        piv_wdf_settings.sig2noise_method = \
+            self.parameter['sig2noise_method']
+        piv_wdf_settings.sig2noise_mask = self.parameter['s2n_mask']
+        return piv_wdf_settings
+
+    def grid(self, shape, n=0):
+        """
+            Return the grid coordinates of a pass.
+
+            The coordinates are computed once per image shape.
+
+            Parameters
+            ----------
+            shape : tuple
+                Shape of the images.
+            n : int
+                Index of the pass, starting at zero.
+
+            Returns
+            -------
+            tuple
+                x, y as 2D arrays. They are shared and must not be
+                modified in place.
+        """
+        key = (tuple(shape), n)
+        if key not in self.grids:
+            self.grids[key] = piv_wdf.get_rect_coordinates(
+                shape, self.windows[n], self.overlaps[n])
+        return self.grids[key]
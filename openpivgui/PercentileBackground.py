@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Median and percentile backgrounds of long image sequences."""
+
+from openpivgui.OutOfCore import row_tiles
+import openpiv.tools as piv_tls
+import multiprocessing
+import tempfile
+import os
+import numpy as np
+
+__licence__ = '''
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+__email__ = 'vennemann@fh-muenster.de'
+
+# Memory of the normalized float64 stack of one strip, including the
+# copy np.percentile works on.
+STRIP_BYTES = 256 * 2**20
+
+
+def _write_frames(args):
+    """Decode images into their layers of the stack, return their maxima."""
+    stack_fname, dtype, shape, first, fnames = args
+    stack = np.memmap(stack_fname, dtype=dtype, mode='r+', shape=shape)
+    maxima = []
+    for i, fname in enumerate(fnames):
+        image = piv_tls.imread(fname)
+        stack[first + i] = image
+        maxima.append(image.max())
+    stack.flush()
+    del stack
+    return maxima
+
+
+def _strip_percentile(args):
+    """Return the percentile of the normalized images of some rows."""
+    stack_fname, dtype, shape, maxima, top, bottom, percentile = args
+    stack = np.memmap(stack_fname, dtype=dtype, mode='r', shape=shape)
+    strip = np.empty((shape[0], bottom - top, shape[2]))
+    for i, maximum in enumerate(maxima):
+        # the same operations as for whole images, so the values are
+        # bitwise identical
+        layer = stack[i, top:bottom] / maximum
+        layer *= 255
+        strip[i] = layer
+    del stack
+    if percentile == 50:
+        return np.median(strip, axis=0)
+    return np.percentile(strip, percentile, axis=0)
+
+
+def _map(func, items, n_cpus):
+    if n_cpus <= 1 or len(items) == 1:
+        return [func(item) for item in items]
+    with multiprocessing.Pool(processes=min(n_cpus, len(items))) as pool:
+        return pool.map(func, items)
+
+
+def percentile_background(fnames, percentile=50.0, n_cpus=1,
+                          strip_bytes=STRIP_BYTES, directory=None):
+    """
+        Compute a percentile of normalized images with bounded memory.
+
+        The images are decoded into a stack in a temporary file, in
+        their original data type (e.g. uint16), so the file is as large
+        as the images decoded. It is placed in »directory«, which
+        should be on a disk: the default temporary directory may be a
+        file system in memory (tmpfs). The stack is then
+        reduced in strips of rows: every strip is read from all images,
+        normalized to a maximum of 255 and reduced with np.percentile,
+        or np.median for the 50th percentile. So the result is
+        identical to the one of the whole stack in memory, while only
+        one strip per process is held. Decoding and strips are
+        distributed over n_cpus processes.
+
+        Parameters
+        ----------
+        fnames : str[]
+            Images.
+        percentile : float
+            Percentile in [0, 100].
+        n_cpus : int
+            Number of processes.
+        strip_bytes : int
+            Memory of the normalized stack of a strip.
+        directory : str
+            Directory of the stack, None for the default temporary
+            directory.
+
+        Returns
+        -------
+        np.array
+            The background as float64 image with values in [0, 255].
+    """
+    first = piv_tls.imread(fnames[0])
+    shape = (len(fnames),) + first.shape
+    with tempfile.NamedTemporaryFile(prefix='openpivgui-',
+                                     suffix='.stack', dir=directory,
+                                     delete=False) as f:
+        stack_fname = f.name
+    try:
+        stack = np.memmap(stack_fname, dtype=first.dtype, mode='w+',
+                          shape=shape)
+        del stack
+        n_blocks = max(1, min(n_cpus, len(fnames)))
+        bounds = [len(fnames) * i // n_blocks for i in range(n_blocks + 1)]
+        maxima = sum(_map(_write_frames,
+                          [(stack_fname, first.dtype, shape, start,
+                            fnames[start:stop])
+                           for start, stop in zip(bounds[:-1], bounds[1:])],
+                          n_cpus), [])
+        rows = max(1, strip_bytes // (16 * len(fnames) * shape[2]))
+        strips = _map(_strip_percentile,
+                      [(stack_fname, first.dtype, shape, maxima, top,
+                        bottom, percentile)
+                       for top, bottom in row_tiles(0, shape[1], rows)],
+                      n_cpus)
+    finally:
+        os.remove(stack_fname)
+    return np.concatenate(strips)
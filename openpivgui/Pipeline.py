@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Streaming evaluation: reader threads, worker processes, writer thread."""
+
+from openpivgui.SharedFrame import SharedFrame
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from multiprocessing import resource_tracker
+import multiprocessing
+import threading
+import queue
+import time
+
+__licence__ = '''
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+__email__ = 'vennemann@fh-muenster.de'
+
+
+class Pipeline:
+    """
+        Process image pairs in three overlapping stages.
+
+        A pool of reader threads decodes the images of upcoming pairs,
+        worker processes evaluate them and a single writer thread
+        saves the results. So reading, computing and writing proceed
+        at the same time, e.g. while a network drive is slow.
+
+        At most »depth« pairs are between reading and writing at any
+        time. If the writer or the workers fall behind, the readers
+        wait, so memory stays bounded.
+
+        Images shared by several pairs, as in (1+2),(2+3) sequences,
+        are decoded only once. With »shared« enabled, each decoded
+        image is placed in a shared memory block and the workers only
+        receive its descriptor, see openpivgui.SharedFrame. The block
+        is freed as soon as the results of all pairs using the image
+        are written.
+
+        Consecutive pairs are handed to the same worker in blocks of
+        »chunksize« pairs, so the frame cache and other state of a
+        worker can be reused from one pair to the next.
+
+        Parameters
+        ----------
+        tasks : tuple[]
+            (index, file_a, file_b) for each image pair.
+        read : function
+            Decodes an image file, called in the reader threads.
+        evaluate : function
+            Module level function, called in the worker processes with
+            a list of (index, file_a, file_b, image_a, image_b) of a
+            block of consecutive pairs. The images are SharedFrame
+            descriptors, if »shared« is enabled. It returns a list of
+            results, one per pair or None for a pair left out, e.g.
+            by cancelling. Each result is handed to write.
+        write : function
+            Called in the writer thread with the result of evaluate.
+        n_cpus : int
+            Number of worker processes.
+        n_readers : int
+            Number of reader threads.
+        depth : int
+            Maximum number of image pairs in flight.
+        initializer, initargs :
+            Passed to multiprocessing.Pool.
+        shared : bool
+            Hand the images to the workers in shared memory.
+        cancel_event : multiprocessing.Event
+            If set, no further pairs are read. The blocks handed to the
+            workers are waited for up to »cancel_timeout« seconds, so
+            the pairs they finished are written, then the workers are
+            terminated.
+        chunksize : int
+            Number of consecutive pairs per block, at most »depth«.
+        cancel_timeout : float
+            Seconds to wait for running blocks after cancelling.
+    """
+
+    def __init__(self, tasks, read, evaluate, write, n_cpus=1,
+                 n_readers=2, depth=8, initializer=None, initargs=(),
+                 shared=True, cancel_event=None, chunksize=1,
+                 cancel_timeout=30):
+        self.tasks = tasks
+        self.read = read
+        self.evaluate = evaluate
+        self.write = write
+        self.n_cpus = max(1, n_cpus)
+        self.n_readers = max(1, n_readers)
+        self.depth = max(1, depth)
+        # a block holds one slot per pair until its results are written
+        self.chunksize = max(1, min(chunksize, self.depth))
+        self.initializer = initializer
+        self.initargs = initargs
+        self.shared = shared
+        self.cancel_event = cancel_event
+        self.cancel_timeout = cancel_timeout
+        self.error = None
+        # blocks handed to the workers
+        self.blocks = []
+        self.lock = threading.Lock()
+        self.images = {}
+        self.pairs = {counter: (file_a, file_b)
+                      for counter, file_a, file_b in tasks}
+        self.users = Counter()
+        for _, file_a, file_b in tasks:
+            self.users[file_a] += 1
+            self.users[file_b] += 1
+
+    def run(self):
+        """Process all tasks, raise the first error that occurred."""
+        self.slots = threading.Semaphore(self.depth)
+        self.results = queue.Queue()
+        writer = threading.Thread(target=self._write_results, daemon=True)
+        writer.start()
+        if self.shared:
+            # Workers have to share the resource tracker of this process,
+            # otherwise their trackers would remove the attached blocks.
+            resource_tracker.ensure_running()
+        pool = multiprocessing.Pool(processes=self.n_cpus,
+                                    initializer=self.initializer,
+                                    initargs=self.initargs)
+        try:
+            with ThreadPoolExecutor(max_workers=self.n_readers) as readers:
+                for i in range(0, len(self.tasks), self.chunksize):
+                    block = self.tasks[i:i + self.chunksize]
+                    # backpressure: wait until pairs have been written
+                    acquired = 0
+                    while acquired < len(block) and not self._stopped():
+                        if self.slots.acquire(timeout=0.1):
+                            acquired += 1
+                    if self._stopped():
+                        break
+                    readers.submit(self._read_block, pool, block)
+            pool.close()
+            if self._stopped():
+                if self.error is None:
+                    # running blocks stop at their next check and
+                    # return the pairs they finished
+                    deadline = time.time() + self.cancel_timeout
+                    for block in self.blocks:
+                        block.wait(max(0, deadline - time.time()))
+                pool.terminate()
+            pool.join()
+            # all results are queued, let the writer finish
+            self.results.put(None)
+            writer.join()
+        finally:
+            pool.terminate()
+            # free the images left after an error or cancellation
+            for event, image in self.images.values():
+                event.wait()
+                if isinstance(image, SharedFrame):
+                    image.release()
+            self.images.clear()
+        if self.error is not None:
+            raise self.error
+
+    def _stopped(self):
+        """True after an error or if the run is cancelled."""
+        return self.error is not None or (self.cancel_event is not None
+                                          and self.cancel_event.is_set())
+
+    def _read_block(self, pool, block):
+        """Decode the images of a block and hand it to a worker."""
+        try:
+            pairs = [(counter, file_a, file_b,
+                      self._image(file_a), self._image(file_b))
+                     for counter, file_a, file_b in block]
+            counters = [counter for counter, _, _ in block]
+
+            def finished(results):
+                for counter, result in zip(counters, results):
+                    if result is not None:
+                        self.results.put((counter, result))
+            self.blocks.append(pool.apply_async(
+                self.evaluate, (pairs,),
+                callback=finished,
+                error_callback=self._fail))
+        except BaseException as e:
+            self._fail(e)
+
+    def _image(self, fname):
+        """Decode an image once, however many pairs it belongs to."""
+        with self.lock:
+            entry = self.images.get(fname)
+            owner = entry is None
+            if owner:
+                entry = self.images[fname] = [threading.Event(), None]
+        if owner:
+            try:
+                image = self.read(fname)
+                if self.shared:
+                    image = SharedFrame(image)
+                entry[1] = image
+            except BaseException as e:
+                entry[1] = e
+            entry[0].set()
+        else:
+            entry[0].wait()
+        if isinstance(entry[1], BaseException):
+            raise entry[1]
+        if isinstance(entry[1], SharedFrame):
+            return entry[1].descriptor
+        return entry[1]
+
+    def _release(self, fname):
+        """Drop an image, when the last pair using it is written."""
+        with self.lock:
+            self.users[fname] -= 1
+            if self.users[fname] > 0:
+                return
+            entry = self.images.pop(fname, None)
+        if entry is not None and isinstance(entry[1], SharedFrame):
+            entry[1].release()
+
+    def _write_results(self):
+        """Writer thread: save the results as they arrive."""
+        while True:
+            item = self.results.get()
+            if item is None or self.error is not None:
+                return
+            counter, result = item
+            try:
+                self.write(result)
+            except BaseException as e:
+                self._fail(e)
+                return
+            for fname in self.pairs[counter]:
+                self._release(fname)
+            self.slots.release()
+
+    def _fail(self, error):
+        """Record the first error and stop the writer."""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            # pairs interrupted by cancelling are simply left out
+            return
+        with self.lock:
+            if self.error is None:
+                self.error = error
+        self.results.put(None)
@@ -3,12 +3,13 @@
 
 """Post Processing for OpenPIVGui."""
 
-from openpivgui.open_piv_gui_tools import create_save_vec_fname, save
+from openpivgui.open_piv_gui_tools import create_save_vec_fname, save, \
+    load
 import openpiv.smoothn as piv_smt
 import openpiv.filters as piv_flt
 import openpiv.validation as piv_vld
 import openpiv.tools as piv_tls
-import numpy as np
+import os
 __licence__ = '''
 This program is free software: you can redistribute it and/or modify
 it under the terms of the GNU General Public License as published by
@@ -54,14 +55,15 @@ class PostProcessing:
         """
         result_fnames = []
         for i, f in enumerate(self.p['fnames']):
-            data = np.loadtxt(f)
+            data = load(f)
             mask = piv_vld.sig2noise_val(
                 data[:, 5],
                 threshold=self.p['sig2noise_threshold'])
 
             save_fname = create_save_vec_fname(
                 path=f,
-                postfix='_sig2noise')
+                postfix='_sig2noise',
+                ext=os.path.splitext(f)[1])
 
             save(data[:, 0],
                  data[:, 1],
@@ -84,7 +86,7 @@ class PostProcessing:
         """
         result_fnames = []
         for i, f in enumerate(self.p['fnames']):
-            data = np.loadtxt(f)
+            data = load(f)
 
             mask = piv_vld.global_std(
                 data[:, 2], data[:, 3],
@@ -92,7 +94,8 @@ class PostProcessing:
 
             save_fname = create_save_vec_fname(
                 path=f,
-                postfix='_std_thrhld')
+                postfix='_std_thrhld',
+                ext=os.path.splitext(f)[1])
             save(data[:, 0],
                  data[:, 1],
                  data[:, 2],
@@ -113,7 +116,7 @@ class PostProcessing:
         """
         result_fnames = []
         for i, f in enumerate(self.p['fnames']):
-            data = np.loadtxt(f)
+            data = load(f)
             mask = piv_vld.global_val(
                 data[:, 2], data[:, 3],
                 u_thresholds=(self.p['MinU'], self.p['MaxU']),
@@ -121,7 +124,8 @@ class PostProcessing:
 
             save_fname = create_save_vec_fname(
                 path=f,
-                postfix='_glob_thrhld')
+                postfix='_glob_thrhld',
+                ext=os.path.splitext(f)[1])
 
             save(data[:, 0],
                  data[:, 1],
@@ -144,7 +148,7 @@ class PostProcessing:
         """
         result_fnames = []
         for i, f in enumerate(self.p['fnames']):
-            data = np.loadtxt(f)
+            data = load(f)
 
             u = data[:, 2].reshape(len(set(data[:, 0])), len(set(data[:, 1])))
             v = data[:, 3].reshape(len(set(data[:, 0])), len(set(data[:, 1])))
@@ -157,7 +161,8 @@ class PostProcessing:
 
             save_fname = create_save_vec_fname(
                 path=f,
-                postfix='_med_thrhld')
+                postfix='_med_thrhld',
+                ext=os.path.splitext(f)[1])
 
             save(data[:, 0],
                  data[:, 1],
@@ -174,7 +179,7 @@ class PostProcessing:
         """Replace outliers."""
         result_fnames = []
         for i, f in enumerate(self.p['fnames']):
-            data = np.loadtxt(f)
+            data = load(f)
 
             shapes = (len(set(data[:, 0])), len(set(data[:, 1])))
 
@@ -190,7 +195,8 @@ class PostProcessing:
                 kernel_size=self.p['repl_kernel'])
             save_fname = create_save_vec_fname(
                 path=f,
-                postfix='_repl')
+                postfix='_repl',
+                ext=os.path.splitext(f)[1])
             save(data[:, 0],
                  data[:, 1],
                  u.flatten(),
@@ -206,7 +212,7 @@ class PostProcessing:
         """Smoothn postprocessing results."""
         result_fnames = []
         for i, f in enumerate(self.p['fnames']):
-            data = np.loadtxt(f)
+            data = load(f)
             shapes = (len(set(data[:, 0])), len(set(data[:, 1])))
 
             u = data[:, 2].reshape(shapes)
@@ -218,7 +224,8 @@ class PostProcessing:
                 data[:, 3], s=self.p['smoothn_val'], isrobust=self.p['robust'])
             save_fname = create_save_vec_fname(
                 path=f,
-                postfix='_smthn')
+                postfix='_smthn',
+                ext=os.path.splitext(f)[1])
             save(data[:, 0],
                  data[:, 1],
                  u, v,
@@ -235,7 +242,7 @@ class PostProcessing:
         u = data[:, 2]
         v = data[:, 3]
         for i, f in enumerate(self.p['fnames']):
-            data = np.loadtxt(f)
+            data = load(f)
             u += data[:,2]; u /= 2
             v += data[:,3]; v /= 2
         save_fname = create_save_vec_fname(
@@ -3,8 +3,13 @@
 
 """Post Processing for OpenPIVGui."""
 
-from skimage import util
-import openpiv.tools as piv_tls
+from openpivgui.BackgroundCache import backgrounds, background_key
+from openpivgui.PercentileBackground import percentile_background
+from openpivgui.SlidingBackground import SlidingBackground, \
+    normalized_image, METHODS
+from openpivgui.StageTimer import stage
+import multiprocessing
+import os
 import numpy as np
 
 __licence__ = '''
@@ -31,54 +36,101 @@ params : openpivgui.OpenPivParams
 '''
 
 
-def gen_background(self, image1=None, image2=None):
+def _reduce_images(args):
+    """Reduce a list of images to their minimum or sum, in place."""
+    fnames, background_type = args
+    result = normalized_image(fnames[0])
+    for fname in fnames[1:]:
+        image = normalized_image(fname)
+        if background_type == 'global min':
+            np.minimum(result, image, out=result)
+        else:
+            result += image
+    return result
+
+
+def _global_background(self, images, n_cpus):
+    """Reduce the images to a global background."""
+    if self.p['background_type'] == 'global percentile':
+        # next to the images and results, unless chosen otherwise
+        directory = self.p['background_stack_dir'] or \
+            os.path.dirname(os.path.abspath(images[0]))
+        return percentile_background(images,
+                                     self.p['background_percentile'],
+                                     n_cpus, directory=directory)
+    n_blocks = max(1, min(n_cpus, len(images) // 2))
+    blocks = [(images[len(images) * i // n_blocks:
+                      len(images) * (i + 1) // n_blocks],
+               self.p['background_type']) for i in range(n_blocks)]
+    if n_blocks == 1:
+        partial = [_reduce_images(blocks[0])]
+    else:
+        with multiprocessing.Pool(processes=n_blocks) as pool:
+            partial = pool.map(_reduce_images, blocks)
+    background = partial[0]
+    for result in partial[1:]:
+        if self.p['background_type'] == 'global min':
+            np.minimum(background, result, out=background)
+        else:
+            background += result
+    if self.p['background_type'] == 'global mean':
+        background /= (self.p['ending_frame'] - self.p['starting_frame'])
+    return background
+
+
+def gen_background(self, image1=None, image2=None, maxima=None, n_cpus=1,
+                   fname=None):
+    """Generate the background image.
+
+    For 'minA - minB', image1 and image2 may be tiles of the frames;
+    maxima then holds the maxima of the whole frames.
+
+    The global backgrounds are streamed through an in-place reduction.
+    With n_cpus > 1, the images are split into contiguous blocks,
+    reduced by separate processes and the partial results combined.
+    The 'global percentile' is computed with bounded memory, see
+    openpivgui.PercentileBackground.
+    If »background_cache« is set, they are reused from memory, with
+    »background_disk_cache« also from disk, as long as the images and
+    settings are unchanged (see openpivgui.BackgroundCache).
+
+    For the sliding backgrounds, the background of the image fname is
+    computed. Evaluations keep a SlidingBackground instead, which
+    updates the window incrementally.
+    """
     self.p = self
+    first = self.p['fnames'][self.p['starting_frame']]
     images = self.p['fnames'][self.p['starting_frame']: self.p['ending_frame']]
     # This needs more testing. It creates artifacts in the correlation
     # for images not selected in the background.
-    if self.p['background_type'] == 'global min':
-        background = piv_tls.imread(self.p['fnames'][self.p['starting_frame']])
-        maximum = background.max()
-        background = background / maximum
-        background *= 255
-        for im in images:
-            # the original image is already included, so skip it in the
-            # for loop
-            if im == self.p['fnames'][self.p['starting_frame']]:
-                pass
-            else:
-                image = piv_tls.imread(im)
-                maximum = image.max()
-                image = image / maximum
-                image *= 255
-                background = np.min(np.array([background, image]), axis=0)
-        return background
-
-    elif self.p['background_type'] == 'global mean':
-        images = self.p['fnames'][self.p['starting_frame']:
-                                  self.p['ending_frame']]
-        background = piv_tls.imread(self.p['fnames'][self.p['starting_frame']])
-        maximum = background.max()
-        background = background / maximum
-        background *= 255
-        for im in images:
-            # the original image is already included, so skip it in the
-            # for loop
-            if im == self.p['fnames'][self.p['starting_frame']]:
-                pass
-            else:
-                image = piv_tls.imread(im)
-                maximum = image.max()
-                image = image / maximum
-                image *= 255
-                background += image
-        background /= (self.p['ending_frame'] - self.p['starting_frame'])
-        return background
+    if self.p['background_type'] in ('global min', 'global mean',
+                                     'global percentile'):
+        # the first image is included once, even if it is listed again
+        images = [first] + [im for im in images if im != first]
+        if not self.p['background_cache']:
+            return _global_background(self, images, n_cpus)
+        settings = {}
+        if self.p['background_type'] == 'global percentile':
+            settings['percentile'] = self.p['background_percentile']
+        key = background_key(images, self.p['background_type'],
+                             self.p['starting_frame'],
+                             self.p['ending_frame'], **settings)
+        return backgrounds.get(
+            key, lambda: _global_background(self, images, n_cpus),
+            disk=self.p['background_disk_cache'])
+
+    elif self.p['background_type'] in METHODS:
+        sliding = SlidingBackground(self.p['fnames'],
+                                    self.p['background_window'],
+                                    METHODS[self.p['background_type']],
+                                    self.p['background_percentile'])
+        return sliding.get(fname)
 
     elif self.p['background_type'] == 'minA - minB':
         # normalize image1 and image2 intensities to [0,255]
-        maximum1 = image1.max()
-        maximum2 = image2.max()
+        if maxima is None:
+            maxima = image1.max(), image2.max()
+        maximum1, maximum2 = maxima
         image1 = image1 / maximum1
         image2 = image2 / maximum2
         image1 *= 255
@@ -90,26 +142,47 @@ def gen_background(self, image1=None, image2=None):
         print('Background algorithm not implemented.')
 
 
-def process_images(self, img, preprocessing_methods, background=None):
-    """Starting the pre-processing chain"""
+def normalized_dtype(img, maximum=None):
+    """Return the data type of an image divided by its maximum."""
+    if maximum is None:
+        maximum = img.dtype.type(1)
+    # type resolution of img / maximum, on a single pixel
+    return np.true_divide(img[(slice(0, 1),) * img.ndim], maximum).dtype
+
+
+def _process_images_builtin(self, img, background, maximum=None,
+                            crop=True, out=None):
+    """Normalization, inversion, background subtraction and cropping.
+
+    The steps run in place on a single buffer, in the order and with
+    the data types of the individual NumPy operations, so the result
+    is the same. The buffer is »out«, if it fits, otherwise a new
+    array. img itself is not modified.
+    """
     # normalize image to [0, 1] float
-    maximum = img.max()
-    img = img / maximum
+    if maximum is None:
+        maximum = img.max()
+    if out is None or out.shape != img.shape \
+            or out.dtype != normalized_dtype(img, maximum):
+        out = None
+    img = np.true_divide(img, maximum, out=out)
     resize = self.p['img_int_resize']
     if self.p['invert']:
-        img = util.invert(img)
+        # skimage.util.invert of a float image
+        np.subtract(1, img, out=img)
 
     if self.p['background_subtract']:
         try:
             img *= 255
             img -= background
-            img[img < 0] = 0  # values less than zero are set to zero
-            img = img / 255
+            # values less than zero are set to zero
+            np.copyto(img, 0, where=img < 0)
+            img /= 255
         except BaseException:
             print('Could not subtract background. Ignoring background '
                   'subtraction.')
     # ROI crop done after background subtraction to avoid image shape issues
-    if self.p['crop_ROI']:
+    if self.p['crop_ROI'] and crop:
         crop_x = (int(list(self.p['crop_roi-xminmax'].split(','))[0]),
                   int(list(self.p['crop_roi-xminmax'].split(','))[1]))
         crop_y = (int(list(self.p['crop_roi-yminmax'].split(','))[0]),
@@ -123,9 +196,36 @@ def process_images(self, img, preprocessing_methods, background=None):
     #                                  threshold=self.p[
     #                                  'dynamic_mask_threshold'])
 
+    return img, resize
+
+
+def process_images(self, img, preprocessing_methods, background=None,
+                   timer=None, maximum=None, crop=True, out=None):
+    """Starting the pre-processing chain
+
+    If a StageTimer is given, the built-in steps and each AddIn method
+    are timed as separate stages.
+
+    For processing an image in tiles, the maximum of the whole image
+    can be given and the cropping can be left to the caller.
+
+    The built-in steps and the final scaling work in place on one
+    buffer. A preallocated buffer of the shape of img and the type of
+    normalized_dtype can be given as »out«, e.g. to reuse it for every
+    frame of a worker. The result may then be a view of »out«.
+    """
+    with stage(timer, 'preprocess'):
+        img, resize = _process_images_builtin(self, img, background,
+                                              maximum, crop, out)
+
     # this for loop is used to load the methods stored in the Add_ins
     # the add_ins have to end with _preprocessing to be loaded here
     for method in preprocessing_methods:
-        img = preprocessing_methods[method](img, self)
-
-    return img * resize
+        with stage(timer, 'preprocess: ' + method):
+            img = preprocessing_methods[method](img, self)
+
+    if preprocessing_methods:
+        # the result of an AddIn may be used elsewhere
+        return img * resize
+    img *= resize
+    return img
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""cProfile and tracemalloc capture of sampled image pairs."""
+
+import tracemalloc
+import cProfile
+import pstats
+
+__licence__ = '''
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+__email__ = 'vennemann@fh-muenster.de'
+
+
+def profile_call(func, *args, memory=False):
+    """
+        Call a function under cProfile and optionally tracemalloc.
+
+        Parameters
+        ----------
+        func : function
+            The function to profile.
+        args :
+            Its arguments.
+        memory : bool
+            Trace memory allocations during the call. Stages timed with
+            openpivgui.StageTimer then record their peak memory.
+
+        Returns
+        -------
+        tuple
+            The return value of func and the raw profile statistics,
+            which can be sent to another process.
+    """
+    if memory:
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    try:
+        result = profiler.runcall(func, *args)
+    finally:
+        if memory:
+            tracemalloc.stop()
+    profiler.create_stats()
+    return result, profiler.stats
+
+
+class _Profile:
+    """Raw statistics in the form pstats.Stats can load."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class ProfileReport:
+    """
+        Merges the profiles and memory peaks of the sampled image pairs
+        of all worker processes.
+    """
+
+    def __init__(self):
+        self.stats = None
+        self.pairs = 0
+        self.peaks = {}
+
+    def add(self, stats, timings=None):
+        """
+            Add the results of a profiled image pair.
+
+            Parameters
+            ----------
+            stats : dict
+                Raw statistics as returned by profile_call.
+            timings : list
+                Stage timings of the pair, see StageTimer.collect.
+        """
+        self.pairs += 1
+        if self.stats is None:
+            self.stats = pstats.Stats(_Profile(stats))
+        else:
+            self.stats.add(_Profile(stats))
+        for entry in timings or []:
+            if len(entry) > 3:
+                self.peaks.setdefault(entry[0], []).append(entry[3])
+
+    def memory_table(self):
+        """Return the peak memory per stage as a text table."""
+        lines = ['{:<32} {:>6} {:>14} {:>14}'.format(
+            'stage', 'count', 'max peak [MB]', 'mean peak [MB]')]
+        for name, peaks in sorted(self.peaks.items(),
+                                  key=lambda item: -max(item[1])):
+            lines.append('{:<32} {:>6} {:>14.1f} {:>14.1f}'.format(
+                name, len(peaks), max(peaks) / 2**20,
+                sum(peaks) / len(peaks) / 2**20))
+        return '\n'.join(lines)
+
+    def write(self, base):
+        """
+            Write <base>.prof and, if memory was traced, <base>_memory.txt.
+
+            The .prof file can be inspected with pstats or tools like
+            snakeviz.
+
+            Parameters
+            ----------
+            base : str
+                Path and filename without extension.
+
+            Returns
+            -------
+            str[]
+                The files written.
+        """
+        fnames = []
+        if self.stats is not None:
+            self.stats.dump_stats(base + '.prof')
+            fnames.append(base + '.prof')
+        if self.peaks:
+            with open(base + '_memory.txt', 'w') as f:
+                f.write(self.memory_table() + '\n')
+            fnames.append(base + '_memory.txt')
+        return fnames
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Progress, throughput and ETA of a PIV evaluation."""
+
+import datetime
+import statistics
+import time
+
+__licence__ = '''
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+__email__ = 'vennemann@fh-muenster.de'
+
+
+class Progress:
+    """
+        Collects the progress events sent by the worker processes.
+
+        Events are dictionaries with the keys »event« ('run', 'start',
+        'pass' or 'done'), »pair« (index of the image pair), »time« (time
+        stamp) and depending on the event:
+
+        - 'run': »total« (sent once by the main process)
+        - 'start': »passes«
+        - 'pass': »pass«, »passes«, »elapsed«
+        - 'done': »elapsed«, »vectors«, »passes« (evaluated passes),
+          »changes« (RMS change of the field per pass, if adaptive)
+
+        Parameters
+        ----------
+        total : int
+            Number of image pairs to be processed.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.vectors = 0
+        self.started = time.time()
+        self.running = {}
+        self.durations = []
+
+    def update(self, event):
+        """
+            Take an event into account.
+
+            Parameters
+            ----------
+            event : dict
+                Progress event of a worker.
+        """
+        kind = event['event']
+        if kind == 'run':
+            self.total = event['total']
+            self.started = event['time']
+        elif kind == 'start':
+            self.running[event['pair']] = dict(event, **{'pass': 0})
+        elif kind == 'pass':
+            if event['pair'] in self.running:
+                self.running[event['pair']]['pass'] = event['pass']
+        elif kind == 'done':
+            self.running.pop(event['pair'], None)
+            self.done += 1
+            self.vectors += event['vectors']
+            self.durations.append(event['elapsed'])
+
+    def throughput(self):
+        """
+            Return the average throughput since the start.
+
+            Returns
+            -------
+            tuple
+                image pairs per second, vectors per second
+        """
+        elapsed = max(time.time() - self.started, 1e-9)
+        return self.done / elapsed, self.vectors / elapsed
+
+    def eta(self):
+        """Return the estimated remaining time in seconds or None."""
+        pairs_per_second, _ = self.throughput()
+        if pairs_per_second == 0:
+            return None
+        return (self.total - self.done) / pairs_per_second
+
+    def stragglers(self, factor=3):
+        """
+            Return the image pairs which take unusually long.
+
+            Parameters
+            ----------
+            factor : float
+                A pair is a straggler, if it runs longer than factor
+                times the median duration of the finished pairs.
+
+            Returns
+            -------
+            int[]
+                Indices of the image pairs.
+        """
+        if not self.durations:
+            return []
+        limit = factor * statistics.median(self.durations)
+        now = time.time()
+        return sorted(pair for pair, event in self.running.items()
+                      if now - event['time'] > limit)
+
+    def summary(self):
+        """Return a one line description of the progress."""
+        pairs_per_second, vectors_per_second = self.throughput()
+        eta = self.eta()
+        if eta is None:
+            eta = '?'
+        else:
+            eta = str(datetime.timedelta(seconds=round(eta)))
+        text = ('{} of {} pair(s), {:.2f} pair(s)/s, {:.0f} vectors/s, '
+                'ETA {}'.format(self.done, self.total, pairs_per_second,
+                                vectors_per_second, eta))
+        stragglers = self.stragglers()
+        if stragglers:
+            text += ', slow: ' + ', '.join(str(p + 1) for p in stragglers)
+        return text
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Bookkeeping of finished image pairs, for resuming interrupted runs."""
+
+import hashlib
+import json
+import os
+
+__licence__ = '''
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+__email__ = 'vennemann@fh-muenster.de'
+
+
+def parameter_hash(parameter):
+    """
+        Hash parameter values in a reproducible way.
+
+        Parameters
+        ----------
+        parameter : dict
+            JSON serializable values (others are converted to str).
+
+        Returns
+        -------
+        str
+            SHA-256 hex digest.
+    """
+    text = json.dumps(parameter, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def file_state(fname):
+    """Return [modification time in ns, size] of a file or None."""
+    try:
+        stat = os.stat(fname)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class ResumeManifest:
+    """
+        A JSON lines file recording each result file of a run.
+
+        Every line holds the name of a result file, the parameter hash
+        it was computed with and the state (modification time and size)
+        of the input images and the result. A result is up to date, if
+        all of these still match. Records are only appended, the last
+        record of a result file is valid.
+
+        Parameters
+        ----------
+        fname : str
+            Path of the manifest file.
+        param_hash : str
+            Hash of the current processing parameters.
+    """
+
+    def __init__(self, fname, param_hash):
+        self.fname = fname
+        self.param_hash = param_hash
+        self.records = {}
+        try:
+            with open(self.fname) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        self.records[record['output']] = record
+                    except (ValueError, KeyError, TypeError):
+                        # e.g. a line cut off by a crash
+                        continue
+        except FileNotFoundError:
+            pass
+
+    def is_current(self, output, inputs):
+        """
+            Check, if a result file is up to date.
+
+            Parameters
+            ----------
+            output : str
+                Result file.
+            inputs : str[]
+                Image files the result is computed from.
+
+            Returns
+            -------
+            bool
+                True, if the pair does not need to be processed again.
+        """
+        record = self.records.get(output)
+        if record is None or record.get('hash') != self.param_hash:
+            return False
+        if record.get('inputs') != [[f, file_state(f)] for f in inputs]:
+            return False
+        state = file_state(output)
+        return state is not None and record.get('state') == state
+
+    def record(self, output, inputs):
+        """
+            Append the record of a finished result file.
+
+            Parameters
+            ----------
+            output : str
+                Result file, already written.
+            inputs : str[]
+                Image files the result is computed from.
+        """
+        record = {'output': output,
+                  'hash': self.param_hash,
+                  'inputs': [[f, file_state(f)] for f in inputs],
+                  'state': file_state(output)}
+        self.records[output] = record
+        with open(self.fname, 'a') as f:
+            f.write(json.dumps(record) + '\n')
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Images in shared memory, handed to worker processes without copies."""
+
+from multiprocessing import shared_memory
+import weakref
+import numpy as np
+
+__licence__ = '''
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+__email__ = 'vennemann@fh-muenster.de'
+
+
+class SharedFrame:
+    """
+        An image, copied once into a shared memory block.
+
+        The block is owned by the process that creates it. Other
+        processes attach to it by means of the descriptor. The owner
+        has to call release, when no process needs the image anymore.
+
+        Parameters
+        ----------
+        image : np.array
+            The decoded image.
+    """
+
+    def __init__(self, image):
+        image = np.asarray(image)
+        self.block = shared_memory.SharedMemory(
+            create=True, size=max(1, image.nbytes))
+        frame = np.ndarray(image.shape, dtype=image.dtype,
+                           buffer=self.block.buf)
+        frame[...] = image
+        del frame
+        self.descriptor = (self.block.name, image.shape, image.dtype.str)
+
+    def release(self):
+        """Free the shared memory block."""
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+
+
+class AttachedFrames:
+    """
+        The shared frames a worker process is attached to.
+
+        Views of a frame may still be held after a task is finished,
+        e.g. by a frame cache. The views do not keep the shared memory
+        mapped, so the views handed out are counted. A block is closed
+        only when all of its views, and arrays derived from them, have
+        been garbage collected.
+    """
+
+    def __init__(self):
+        # name: [shared_memory.SharedMemory, number of live views]
+        self.blocks = {}
+
+    def get(self, descriptor):
+        """
+            Return a read only view of a shared frame.
+
+            Parameters
+            ----------
+            descriptor : tuple
+                SharedFrame.descriptor
+
+            Returns
+            -------
+            np.array
+                The image, without a copy.
+        """
+        name, shape, dtype = descriptor
+        if name not in self.blocks:
+            self.blocks[name] = [shared_memory.SharedMemory(name=name), 0]
+        block = self.blocks[name]
+        frame = np.ndarray(shape, dtype=np.dtype(dtype),
+                           buffer=block[0].buf)
+        frame.flags.writeable = False
+        block[1] += 1
+        # slices of the frame refer to it as their base, so it lives as
+        # long as any of them
+        weakref.finalize(frame, self._view_released, name)
+        return frame
+
+    def _view_released(self, name):
+        self.blocks[name][1] -= 1
+
+    def collect(self):
+        """Close all blocks that are not referenced anymore."""
+        for name in list(self.blocks):
+            block, views = self.blocks[name]
+            if views > 0:
+                continue
+            block.close()
+            del self.blocks[name]
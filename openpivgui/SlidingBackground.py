@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Backgrounds over a sliding window of neighbouring images."""
+
+import openpiv.tools as piv_tls
+import numpy as np
+
+__licence__ = '''
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+__email__ = 'vennemann@fh-muenster.de'
+
+METHODS = {'sliding min': 'min',
+           'sliding mean': 'mean',
+           'sliding percentile': 'percentile'}
+
+
+def normalized_image(fname):
+    """Read an image and scale it to a maximum of 255."""
+    image = piv_tls.imread(fname)
+    maximum = image.max()
+    image = image / maximum
+    image *= 255
+    return image
+
+
+class MinQueue:
+    """
+        A queue of images returning their pixelwise minimum in O(1).
+
+        The queue consists of two stacks. New images are pushed on the
+        back stack, which keeps the minimum of its images. The front
+        stack holds the minima from each of its images to the end of
+        the stack. If it runs empty, the back stack is moved over,
+        computing these minima once. So each image takes part in a
+        constant number of comparisons, independent of the length of
+        the queue (the vectorized form of a monotonic deque).
+    """
+
+    def __init__(self):
+        self.back = []
+        self.back_min = None
+        self.front = []
+
+    def __len__(self):
+        return len(self.back) + len(self.front)
+
+    def push(self, image):
+        """Append an image."""
+        self.back.append(image)
+        if self.back_min is None:
+            self.back_min = image.copy()
+        else:
+            np.minimum(self.back_min, image, out=self.back_min)
+
+    def pop(self):
+        """Remove the oldest image."""
+        if not self.front:
+            minimum = None
+            while self.back:
+                image = self.back.pop()
+                if minimum is None:
+                    minimum = image
+                else:
+                    minimum = np.minimum(minimum, image)
+                self.front.append(minimum)
+            self.back_min = None
+        self.front.pop()
+
+    def minimum(self):
+        """Return the minimum of all images as a new array."""
+        if not self.front:
+            return self.back_min.copy()
+        if self.back_min is None:
+            return self.front[-1].copy()
+        return np.minimum(self.front[-1], self.back_min)
+
+
+class SlidingBackground:
+    """
+        Background of each image over its neighbours in the sequence.
+
+        The background of image i is the minimum, mean or percentile of
+        the normalized images i - k ... i + k of the file list, limited
+        to the available images at both ends of the list. Moving on to
+        the next image, one image enters and one leaves the window: the
+        mean is kept as a running sum, the minimum by a MinQueue. So
+        each image is read once and a background costs O(1) instead of
+        O(k) for a sequential run.
+
+        For the mean and the percentile, the images of the window are
+        kept in a preallocated ring buffer of 2k + 1 images, the
+        entering image replaces the leaving one. The percentile is
+        computed from the buffer, which costs O(k) per image, as an
+        exact percentile has to look at every image of the window.
+
+        Each worker process keeps its own window. Requesting a later
+        image moves the window forward, an earlier image or one beyond
+        the window starts a new window. So the images should be
+        requested in the order of the sequence.
+
+        Parameters
+        ----------
+        fnames : str[]
+            Image files in the order of the sequence.
+        window : int
+            Number k of images before and after the current one.
+        method : str
+            'min', 'mean' or 'percentile'.
+        percentile : float
+            Percentile in [0, 100] of the 'percentile' method.
+        read : function
+            Returns the normalized image of a filename.
+    """
+
+    def __init__(self, fnames, window, method='min', percentile=50.0,
+                 read=normalized_image):
+        self.fnames = list(fnames)
+        self.index = {fname: i for i, fname in enumerate(self.fnames)}
+        self.window = max(0, window)
+        self.method = method
+        self.percentile = percentile
+        self.read = read
+        # ring buffer, image j of the file list is held in slot
+        # j % (2k + 1)
+        self.stack = None
+        self._reset()
+
+    def __getstate__(self):
+        """Workers start with an empty window."""
+        state = self.__dict__.copy()
+        state['stack'] = None
+        state['minima'] = MinQueue()
+        state['total'] = None
+        state['current'] = None
+        state['background'] = None
+        return state
+
+    def _reset(self):
+        self.minima = MinQueue()
+        self.total = None
+        # images start ... stop - 1 are in the window
+        self.start = self.stop = 0
+        self.current = None
+        self.background = None
+
+    def _slot(self, i):
+        return i % (2 * self.window + 1)
+
+    def _push(self, i):
+        image = self.read(self.fnames[i])
+        if self.method == 'min':
+            self.minima.push(image)
+            return
+        if self.stack is None or self.stack.shape[1:] != image.shape:
+            self.stack = np.empty((2 * self.window + 1,) + image.shape)
+        self.stack[self._slot(i)] = image
+        if self.method == 'mean':
+            if self.total is None:
+                self.total = image.copy()
+            else:
+                self.total += image
+
+    def _pop(self, i):
+        if self.method == 'min':
+            self.minima.pop()
+        elif self.method == 'mean':
+            self.total -= self.stack[self._slot(i)]
+
+    def get(self, fname):
+        """
+            Return the background of an image.
+
+            Parameters
+            ----------
+            fname : str
+                Image file of the list.
+
+            Returns
+            -------
+            np.array
+                The background as float64 image with values in
+                [0, 255].
+        """
+        i = self.index[fname]
+        if i == self.current:
+            return self.background
+        start = max(0, i - self.window)
+        stop = min(len(self.fnames), i + self.window + 1)
+        if self.current is None or i < self.current \
+                or start >= self.stop:
+            self._reset()
+            self.start = self.stop = start
+        # the leaving image frees its slot for the entering one
+        while self.start < start:
+            self._pop(self.start)
+            self.start += 1
+        while self.stop < stop:
+            self._push(self.stop)
+            self.stop += 1
+        if self.method == 'min':
+            background = self.minima.minimum()
+        elif self.method == 'mean':
+            background = self.total / (self.stop - self.start)
+        else:
+            if self.stop - self.start == len(self.stack):
+                images = self.stack
+            else:
+                # at the ends of the list, the window is not full
+                images = self.stack[[self._slot(j) for j in
+                                     range(self.start, self.stop)]]
+            background = np.percentile(images, self.percentile, axis=0)
+        self.current, self.background = i, background
+        return background
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Wall and CPU time of the stages of a PIV evaluation."""
+
+from contextlib import contextmanager, nullcontext
+import tracemalloc
+import json
+import time
+
+__licence__ = '''
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+__email__ = 'vennemann@fh-muenster.de'
+
+
+def stage(timer, name):
+    """
+        Time a block of code, if a timer is given.
+
+        Usage::
+
+            with stage(timer, 'validation pass 1'):
+                ...
+
+        Parameters
+        ----------
+        timer : StageTimer or None
+            If None, nothing is measured.
+        name : str
+            Name of the stage.
+    """
+    if timer is None:
+        return nullcontext()
+    return timer.stage(name)
+
+
+class StageTimer:
+    """
+        Records the wall and CPU time of named stages.
+
+        The CPU time is the one of the whole process, so it includes
+        threads started by libraries like numpy.
+
+        While tracemalloc is tracing, the peak of the memory allocated
+        within a stage is recorded as well.
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        """Context manager measuring the enclosed block."""
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            entry = [name,
+                     time.perf_counter() - wall,
+                     time.process_time() - cpu]
+            if tracing:
+                entry.append(tracemalloc.get_traced_memory()[1] - memory)
+            self.stages.append(entry)
+
+    def collect(self):
+        """
+            Return and forget the stages recorded so far.
+
+            Returns
+            -------
+            list
+                [name, wall time in s, CPU time in s] for each stage,
+                followed by the peak memory in bytes, if traced.
+        """
+        stages, self.stages = self.stages, []
+        return stages
+
+
+class TimingLog:
+    """
+        Writes the stage timings of each image pair as JSON lines and
+        sums them up per stage.
+
+        Parameters
+        ----------
+        fname : str
+            Path of the JSON lines file. An existing file is replaced.
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.totals = {}
+        open(self.fname, 'w').close()
+
+    def record(self, counter, stages, **info):
+        """
+            Append the timings of an image pair.
+
+            Parameters
+            ----------
+            counter : int
+                Index of the image pair.
+            stages : list
+                As returned by StageTimer.collect.
+            info :
+                Further entries of the record, like the filenames.
+        """
+        for name, wall, cpu, *_ in stages:
+            total = self.totals.setdefault(name, [0, 0.0, 0.0])
+            total[0] += 1
+            total[1] += wall
+            total[2] += cpu
+        with open(self.fname, 'a') as f:
+            f.write(json.dumps(dict(info, pair=counter, stages=stages)) +
+                    '\n')
+
+    def summary(self, fname=None):
+        """
+            Return the summed up timings of all recorded pairs.
+
+            Parameters
+            ----------
+            fname : str
+                If given, the summary is written to this JSON file.
+
+            Returns
+            -------
+            str
+                A table of the stages, sorted by wall time.
+        """
+        wall_total = sum(t[1] for t in self.totals.values()) or 1.0
+        stages = [{'stage': name, 'count': count, 'wall': wall, 'cpu': cpu,
+                   'wall_share': wall / wall_total}
+                  for name, (count, wall, cpu) in self.totals.items()]
+        stages.sort(key=lambda s: s['wall'], reverse=True)
+        if fname is not None:
+            with open(fname, 'w') as f:
+                json.dump({'stages': stages}, f, indent=1)
+        lines = ['{:<32} {:>6} {:>10} {:>10} {:>6}'.format(
+            'stage', 'count', 'wall [s]', 'cpu [s]', 'share')]
+        for s in stages:
+            lines.append('{:<32} {:>6} {:>10.3f} {:>10.3f} {:>5.1f}%'.format(
+                s['stage'], s['count'], s['wall'], s['cpu'],
+                100 * s['wall_share']))
+        return '\n'.join(lines)
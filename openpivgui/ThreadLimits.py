@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Number of BLAS/OpenMP threads used by each worker process."""
+
+from contextlib import contextmanager
+import os
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+__licence__ = '''
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+__email__ = 'vennemann@fh-muenster.de'
+
+THREAD_VARIABLES = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                    'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS',
+                    'NUMEXPR_NUM_THREADS')
+
+# keeps the limits of threadpoolctl active in a worker process
+_limits = None
+
+
+def threads_per_worker(n_cpus, threads=0):
+    """
+        Return the number of library threads of each worker.
+
+        Parameters
+        ----------
+        n_cpus : int
+            Number of worker processes.
+        threads : int
+            Requested number of threads, 0 to share the cores evenly
+            between the workers.
+
+        Returns
+        -------
+        int
+            At least one thread.
+    """
+    if threads > 0:
+        return threads
+    return max(1, (os.cpu_count() or 1) // max(1, n_cpus))
+
+
+@contextmanager
+def thread_environment(threads):
+    """
+        Set the thread variables of BLAS and OpenMP while starting workers.
+
+        Libraries read these variables, when they are loaded. This is
+        the case for worker processes started with the »spawn« method
+        (default on Windows and macOS). Forked workers inherit the
+        loaded libraries, see limit_threads.
+
+        Parameters
+        ----------
+        threads : int
+            Number of threads per worker process.
+    """
+    previous = {name: os.environ.get(name) for name in THREAD_VARIABLES}
+    os.environ.update({name: str(threads) for name in THREAD_VARIABLES})
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def limit_threads(threads):
+    """
+        Limit the thread pools already loaded in a worker process.
+
+        This requires the optional package threadpoolctl. Without it,
+        only the environment set by thread_environment takes effect.
+
+        Parameters
+        ----------
+        threads : int
+            Number of threads.
+
+        Returns
+        -------
+        bool
+            True, if the limits could be applied.
+    """
+    global _limits
+    if threadpool_limits is None:
+        return False
+    _limits = threadpool_limits(limits=threads)
+    return True
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Parallel evaluation of a single image pair in horizontal bands."""
+
+from openpivgui.OutOfCore import scratch_array
+from concurrent.futures import ThreadPoolExecutor
+from scipy.interpolate import RectBivariateSpline
+import scipy.ndimage as scn
+import numpy as np
+import openpiv.pyprocess as piv_prc
+import openpiv.validation as piv_vld
+import openpiv.filters as piv_flt
+import openpiv.windef as piv_wdf
+
+__licence__ = '''
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+__email__ = 'vennemann@fh-muenster.de'
+
+# Rows beyond the sampled ones, over which the spline prefilter of
+# scipy.ndimage.map_coordinates (order > 1) has decayed below the
+# precision of float64.
+PREFILTER_HALO = 32
+
+
+def split_rows(n_rows, n_bands):
+    """
+        Split rows into contiguous bands of about equal size.
+
+        Parameters
+        ----------
+        n_rows : int
+            Number of rows.
+        n_bands : int
+            Number of bands, reduced if there are fewer rows.
+
+        Returns
+        -------
+        list
+            (start, stop) of each band.
+    """
+    n_bands = max(1, min(n_bands, n_rows))
+    bounds = [n_rows * i // n_bands for i in range(n_bands + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class TileParallel:
+    """
+        Evaluates one image pair with several threads.
+
+        The rows of the interrogation grid are split into horizontal
+        bands. Each band is correlated on the image rows its windows
+        cover, so the halo of a band is the overlap of its windows
+        with the neighbouring bands. In later passes, the deformed
+        frames are interpolated band by band from the full frames,
+        which covers any displacement. The bands are stitched before
+        validation, replacement and smoothing, which need the whole
+        field. The result equals the one of a single thread.
+
+        NumPy's FFT and scipy.ndimage release the GIL, so the threads
+        run in parallel.
+
+        For frames larger than the memory (see openpivgui.OutOfCore),
+        the bands can be limited to a number of image rows. Deformed
+        frames are then written to temporary files and each band is
+        interpolated from the frame rows it samples plus a halo. With
+        an interpolation order above one, this matches the in-memory
+        result within rounding errors.
+
+        Parameters
+        ----------
+        n_bands : int
+            Number of threads and minimum number of bands.
+        tile_rows : int
+            Maximum number of image rows per band, if given.
+        out_of_core : bool
+            Keep deformed frames in temporary files.
+        correlation : openpivgui.CorrelationEngine
+            If given, used to correlate the later passes instead of
+            openpiv.pyprocess.extended_search_area_piv, e.g. for single
+            precision FFTs.
+    """
+
+    def __init__(self, n_bands, tile_rows=None, out_of_core=False,
+                 correlation=None):
+        self.n_bands = max(1, n_bands)
+        self.tile_rows = tile_rows
+        self.out_of_core = out_of_core
+        self.correlation = correlation
+        self.executor = None
+
+    def __getstate__(self):
+        """Threads are started again in each worker process."""
+        state = self.__dict__.copy()
+        state['executor'] = None
+        return state
+
+    def map(self, func, items):
+        """Return [func(item) for item in items], computed by the threads."""
+        if len(items) == 1:
+            return [func(items[0])]
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.n_bands, thread_name_prefix='band')
+        return list(self.executor.map(func, items))
+
+    def bands(self, n_rows, row_height=1, extra_rows=0):
+        """
+            Split rows into bands, respecting »tile_rows«.
+
+            Parameters
+            ----------
+            n_rows : int
+                Number of rows (of the grid or the image).
+            row_height : int
+                Image rows per row.
+            extra_rows : int
+                Image rows a band covers in addition.
+
+            Returns
+            -------
+            list
+                (start, stop) of each band.
+        """
+        n_bands = self.n_bands
+        if self.tile_rows is not None:
+            per_band = max(1, (self.tile_rows - extra_rows) // row_height)
+            n_bands = max(n_bands, -(-n_rows // per_band))
+        return split_rows(n_rows, n_bands)
+
+    def correlate(self, correlate, frame_a, frame_b, window_size, overlap,
+                  **kwargs):
+        """
+            Correlate a pair band by band.
+
+            Parameters
+            ----------
+            correlate : function
+                Called as correlate(band_a, band_b, window_size=...,
+                overlap=..., **kwargs), returns u, v, sig2noise.
+            frame_a, frame_b : np.array
+                Images.
+            window_size : int
+                Size of the interrogation windows.
+            overlap : int
+                Overlap of the interrogation windows.
+
+            Returns
+            -------
+            tuple
+                u, v, sig2noise as 2D arrays of the whole grid.
+        """
+        n_rows, n_cols = piv_prc.get_field_shape(
+            frame_a.shape, (window_size, window_size), (overlap, overlap))
+        step = window_size - overlap
+
+        def band(rows):
+            start, stop = rows
+            # image rows covered by the windows of the band
+            top, bottom = start * step, (stop - 1) * step + window_size
+            return [np.reshape(field, (stop - start, n_cols))
+                    for field in correlate(frame_a[top:bottom],
+                                           frame_b[top:bottom],
+                                           window_size=window_size,
+                                           overlap=overlap,
+                                           **kwargs)]
+        parts = self.map(band, self.bands(n_rows, step,
+                                          window_size - step))
+        return tuple(np.concatenate(field) for field in zip(*parts))
+
+    def deform(self, frame, x, y, u, v, sign_u, sign_v,
+               interpolation_order, dtype=None):
+        """
+            Deform a frame band by band, like openpiv.windef.
+
+            The displacements u, v of the grid x, y are interpolated to
+            each pixel, with cubic splines as in
+            windef.create_deformation_field. The frame is sampled at
+            the pixel coordinates shifted by sign_u * u, sign_v * v.
+
+            Returns
+            -------
+            np.array
+                The deformed frame.
+        """
+        if dtype is not None and not self.out_of_core:
+            frame = frame.astype(dtype)
+        ip_u = RectBivariateSpline(y[:, 0], x[0, :], u, kx=3, ky=3)
+        ip_v = RectBivariateSpline(y[:, 0], x[0, :], v, kx=3, ky=3)
+        side_x = np.arange(frame.shape[1])
+        side_y = np.arange(frame.shape[0])
+
+        def band(rows):
+            start, stop = rows
+            xt, yt = np.meshgrid(side_x, side_y[start:stop])
+            ut = ip_u(side_y[start:stop], side_x)
+            vt = ip_v(side_y[start:stop], side_x)
+            sample_y = yt + sign_v * vt
+            sample_x = xt + sign_u * ut
+            if not self.out_of_core:
+                return scn.map_coordinates(
+                    frame, (sample_y, sample_x),
+                    order=interpolation_order, mode='nearest')
+            # only the sampled rows and a halo are read; subtracting the
+            # integer offset from the coordinates is exact
+            halo = interpolation_order + 1
+            if interpolation_order > 1:
+                halo += PREFILTER_HALO
+            bottom = int(np.ceil(sample_y.max())) + halo + 1
+            bottom = min(frame.shape[0], max(1, bottom))
+            top = int(np.floor(sample_y.min())) - halo
+            top = min(max(0, top), bottom - 1)
+            tile = frame[top:bottom]
+            if dtype is not None:
+                tile = tile.astype(dtype)
+            deformed[start:stop] = scn.map_coordinates(
+                tile, (sample_y - top, sample_x),
+                order=interpolation_order, mode='nearest')
+        bands = self.bands(frame.shape[0])
+        if not self.out_of_core:
+            return np.concatenate(self.map(band, bands))
+        deformed = scratch_array(frame.shape, dtype or frame.dtype)
+        self.map(band, bands)
+        return deformed
+
+    def multipass_img_deform(self, frame_a, frame_b, current_iteration,
+                             x_old, y_old, u_old, v_old, settings):
+        """
+            Band parallel version of openpiv.windef.multipass_img_deform.
+
+            Parameters and results are the same as the ones of the
+            OpenPIV function.
+        """
+        if not isinstance(u_old, np.ma.MaskedArray):
+            raise ValueError('Expected masked array')
+        window_size = settings.windowsizes[current_iteration]
+        overlap = settings.overlap[current_iteration]
+        x, y = piv_wdf.get_rect_coordinates(frame_a.shape, window_size,
+                                            overlap)
+
+        # displacements of the previous pass on the new grid
+        ip = RectBivariateSpline(y_old[:, 0], x_old[0, :],
+                                 np.ma.filled(u_old, 0.))
+        u_pre = ip(y[:, 0], x[0, :])
+        ip2 = RectBivariateSpline(y_old[:, 0], x_old[0, :],
+                                  np.ma.filled(v_old, 0.))
+        v_pre = ip2(y[:, 0], x[0, :])
+
+        if settings.deformation_method == 'symmetric':
+            frame_a = self.deform(frame_a, x, y, u_pre, v_pre, -0.5, -0.5,
+                                  settings.interpolation_order)
+            frame_b = self.deform(frame_b, x, y, u_pre, v_pre, 0.5, 0.5,
+                                  settings.interpolation_order)
+        elif settings.deformation_method == 'second image':
+            # windef.deform_windows with v inverted
+            frame_b = self.deform(frame_b, x, y, u_pre, -v_pre, 1, -1,
+                                  settings.interpolation_order,
+                                  dtype=np.float32)
+        else:
+            raise Exception('Deformation method is not valid.')
+
+        if settings.sig2noise_validate is False:
+            settings.sig2noise_method = None
+
+        if self.correlation is not None:
+            correlate, options = self.correlation.correlate, {}
+        else:
+            correlate = piv_prc.extended_search_area_piv
+            options = {'use_vectorized': settings.use_vectorized}
+        u, v, s2n = self.correlate(
+            correlate,
+            frame_a, frame_b, window_size, overlap,
+            width=settings.sig2noise_mask,
+            subpixel_method=settings.subpixel_method,
+            sig2noise_method=settings.sig2noise_method,
+            correlation_method=settings.correlation_method,
+            normalized_correlation=settings.normalized_correlation,
+            **options)
+        u += u_pre
+        v += v_pre
+
+        if settings.static_mask is not None:
+            grid_mask = scn.map_coordinates(settings.static_mask,
+                                            [y, x]).astype(bool)
+        else:
+            grid_mask = np.zeros_like(u, dtype=bool)
+        u = np.ma.masked_array(u, mask=grid_mask)
+        v = np.ma.masked_array(v, mask=grid_mask)
+
+        flags = piv_vld.typical_validation(u, v, s2n, settings)
+        if np.all(flags):
+            raise ValueError('Something happened in the validation')
+        u, v = piv_flt.replace_outliers(
+            u, v, flags,
+            method=settings.filter_method,
+            max_iter=settings.max_filter_iteration,
+            kernel_size=settings.filter_kernel_size)
+        return x, y, u, v, grid_mask, flags
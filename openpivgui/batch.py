@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Headless batch processing of PIV images, without a Tk GUI.
+
+Usage::
+
+    python3 -m openpivgui.batch settings.json [files ...] [--cores N]
+
+The settings file is a session dump, as written by »File/Save session«
+in the GUI. The AddIns listed in its »used_addins« entry are loaded and
+take part in the processing chain exactly as they do in the GUI.
+"""
+
+from openpivgui.ErrorChecker import check_PIVprocessing
+from openpivgui.MultiProcessing import MultiProcessing
+from openpivgui.OpenPivParams import OpenPivParams
+from openpivgui.Progress import Progress
+import openpivgui.AddInHandler as AddInHandler
+import argparse
+import threading
+import os
+
+__licence__ = '''
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+__email__ = 'vennemann@fh-muenster.de'
+
+
+class BatchSession:
+    """
+        Stand-in for OpenPivGui, holding parameters and AddIn methods.
+
+        AddIns register their methods on this object in the same way
+        as they do on the GUI, so MultiProcessing can be fed with it
+        on machines without a display.
+
+        Parameters
+        ----------
+        settings : str
+            Path of a session file in JSON format.
+        fnames : str[]
+            Image files to process. If empty, the file list stored
+            in the session file is used.
+    """
+
+    def __init__(self, settings=None, fnames=None):
+        """Load the parameters and initialize the selected AddIns."""
+        self.buttons = {}
+        self.preprocessing_methods = {}
+        self.postprocessing_methods = {}
+        self.plotting_methods = {}
+        self.p = OpenPivParams()
+        if settings is not None:
+            self.p.load_settings(settings)
+        AddInHandler.init_add_ins(self)
+        # AddIn parameters are unknown before init_add_ins, so the
+        # session file is read again to restore their values as well
+        if settings is not None:
+            self.p.load_settings(settings)
+        if fnames:
+            self.p['fnames'] = list(fnames)
+        # result files are placed next to the images, which needs a
+        # directory also for relative paths
+        self.p['fnames'] = [os.path.abspath(f) for f in self.p['fnames']]
+        # there is nobody to click away popup windows
+        self.p['warnings'] = False
+        self.p['pop_up_info'] = False
+
+    def get_parameters(self):
+        return self.p
+
+    def processing(self, n_cpus=None):
+        """
+            Run the PIV evaluation.
+
+            Parameters
+            ----------
+            n_cpus : int
+                Number of worker processes. Default: all available cores.
+
+            Returns
+            -------
+            str[]
+                List of filenames with resulting PIV data.
+        """
+        check_PIVprocessing(self.p)
+        mp = MultiProcessing(self)
+        if n_cpus is None:
+            n_cpus = os.cpu_count()
+        print('Processing {} PIV image pair(s) on {} core(s).'
+              .format(mp.get_num_frames(), n_cpus))
+        reporter = threading.Thread(target=self.report_progress,
+                                    args=(mp,), daemon=True)
+        reporter.start()
+        try:
+            mp.run(n_cpus=n_cpus)
+        finally:
+            mp.events.put(None)
+            reporter.join()
+        return mp.get_save_fnames()
+
+    def report_progress(self, mp):
+        """Print a progress line for every finished image pair."""
+        progress = Progress(mp.get_num_frames())
+        for event in iter(mp.events.get, None):
+            progress.update(event)
+            if event['event'] == 'done':
+                print('Progress: ' + progress.summary())
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(
+        prog='python3 -m openpivgui.batch',
+        description='Headless PIV evaluation with OpenPivGui settings.')
+    parser.add_argument(
+        'settings',
+        help='session file in JSON format (»File/Save session«)')
+    parser.add_argument(
+        'files', nargs='*',
+        help='image files (default: file list of the session file)')
+    parser.add_argument(
+        '-c', '--cores', type=int, default=None,
+        help='number of worker processes (default: all cores)')
+    args = parser.parse_args(argv)
+    if not os.path.isfile(args.settings):
+        parser.error('settings file not found: ' + args.settings)
+    if args.cores is not None and args.cores < 1:
+        parser.error('the number of cores has to be at least one')
+
+    session = BatchSession(args.settings, args.files)
+    for fname in session.processing(n_cpus=args.cores):
+        print(fname)
+
+
+if __name__ == '__main__':
+    main()
@@ -67,7 +67,8 @@ def create_save_vec_fname(path=os.getcwd(),
                           basename=None,
                           postfix='',
                           count=-1,
-                          max_count=9):
+                          max_count=9,
+                          ext='.vec'):
     '''Assembles a valid absolute path for saving vector data.
 
     Parameters
@@ -84,6 +85,9 @@ def create_save_vec_fname(path=os.getcwd(),
     max_count : int
         Highest number to expect. Used for generating
         leading zeros. Default: 9 (no leading zeros).
+    ext : str
+        File extension, '.vec' (text) or '.npz' (binary).
+        Default: '.vec'.
     '''
     if count == -1:
         num = ''
@@ -98,7 +102,7 @@ def create_save_vec_fname(path=os.getcwd(),
            basename.split('.')[0] +
            postfix +
            num +
-           '.vec')
+           ext)
 
 
 def get_dim(array):
@@ -126,8 +130,85 @@ def get_dim(array):
 
 
 def save(x, y, u, v, mask, sig2noise, filename, fmt='%8.4f', delimiter='\t'):
-    out = np.vstack([m.ravel() for m in [x, y, u, v, mask, sig2noise]])
-    np.savetxt(filename, out.T, fmt=fmt, delimiter=delimiter)
+    '''Saves vector data, either as text or binary.
+
+    Files ending with '.npz' are written by save_npz(), all other
+    files as text columns x, y, u, v, mask, sig2noise.
+
+    The data is written to a temporary file first, which then replaces
+    the result file. So a cancelled or crashed run never leaves a
+    truncated result behind.
+
+    Parameters
+    ----------
+    x, y, u, v, mask, sig2noise : np.array
+        Vector data, either as 2D fields or flat columns.
+    filename : str
+        Path of the result file.
+    fmt : str
+        Number format of text files. Default: '%8.4f'.
+    delimiter : str
+        Column delimiter of text files. Default: tab.
+    '''
+    part = filename + '.part'
+    if filename.endswith('.npz'):
+        save_npz(x, y, u, v, mask, sig2noise, part)
+    else:
+        out = np.vstack([m.ravel() for m in [x, y, u, v, mask, sig2noise]])
+        np.savetxt(part, out.T, fmt=fmt, delimiter=delimiter)
+    os.replace(part, filename)
+
+
+def save_npz(x, y, u, v, mask, sig2noise, filename):
+    '''Saves vector data as float32 arrays in a binary .npz file.
+
+    Besides the arrays x, y, u, v, mask and sig2noise, the shape of
+    the vector field is stored, so the fields can be restored
+    without parsing the coordinates.
+
+    Parameters
+    ----------
+    x, y, u, v, mask, sig2noise : np.array
+        Vector data, either as 2D fields or flat columns.
+    filename : str
+        Path of the result file.
+    '''
+    x = np.asarray(x)
+    if x.ndim == 2:
+        shape = x.shape
+    else:
+        shape = (len(np.unique(y)), len(np.unique(x)))
+        if shape[0] * shape[1] != x.size:
+            shape = (x.size,)
+    fields = {'x': x, 'y': y, 'u': u, 'v': v,
+              'mask': mask, 'sig2noise': sig2noise}
+    with open(filename, 'wb') as f:
+        np.savez(f,
+                 shape=np.array(shape),
+                 **{key: np.asarray(fields[key], dtype=np.float32).ravel()
+                    for key in fields})
+
+
+def load(filename):
+    '''Loads vector data saved by save().
+
+    Parameters
+    ----------
+    filename : str
+        Path of a text or .npz result file.
+
+    Returns
+    -------
+    np.array
+        Columns x, y, u, v, mask, sig2noise, one row per vector,
+        as returned by np.loadtxt() for text files.
+    '''
+    if filename.endswith('.npz'):
+        with np.load(filename) as data:
+            return np.column_stack(
+                [data[key].astype(float) for key in
+                 ['x', 'y', 'u', 'v', 'mask', 'sig2noise']])
+    return np.loadtxt(filename)
 
 
 def _round(number, decimals=0):
@@ -16,6 +16,7 @@ This module can be used in two different ways:
    For now, not all functions are callable in this way.
 """
 
+from openpivgui.open_piv_gui_tools import load
 import numpy as np
 from matplotlib import pyplot as plt
 import matplotlib
@@ -144,7 +145,7 @@ def profiles(data, parameter, fname, figure, orientation):
             vertical: Plot v_x over y.
     """
     #data = data.to_numpy().astype(float)
-    data = np.loadtxt(fname)
+    data = load(fname)
 
     dim_x, dim_y = get_dim(data)
 
@@ -524,7 +525,7 @@ if __name__ == "__main__":
                         default=True,
                         help='Invert y-axis of vector plot')
     args = parser.parse_args()
-    data = np.loadtxt(args.fname)
+    data = load(args.fname)
     fig = Figure()
     if args.plot_type == 'histogram':
         histogram(data,